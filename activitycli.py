@@ -0,0 +1,186 @@
+"""
+Copyright (C) 2023  Craig S. Chisholm
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sys
+import os
+import csv
+import json
+import argparse
+import datetime
+from activitystore import activityStore, rangeDays, valueStats, AGGREGATIONS, AGGREGATE_FUNCTIONS, MERGE_OVERLAPS
+from activityio import loadFile, loadFiles, saveFile, importCsv, projectName, julianDay, dateFromJulianDay
+
+RANGE_CHOICES = {'7': 'Last 7 days', '30': 'Last 30 days', 'all': 'All time'}
+
+#Stands in for the project name in output when --merge is given
+MERGED_NAME = 'merged'
+
+def _dateArg(text: str) -> int:
+    return julianDay(datetime.date.fromisoformat(text))
+
+def _range(args) -> tuple:
+    today = julianDay(datetime.date.today())
+    if args.start is not None or args.end is not None:
+        return rangeDays('Custom',today,args.start,args.end)
+    return rangeDays(RANGE_CHOICES[args.range],today)
+
+def _pairs(items: activityStore, itemKey, fieldKey) -> list:
+    '''(activity, field) pairs selected on the command line, every pair when not given'''
+    itemKeys = list(items.schema.keys()) if itemKey is None else [itemKey]
+    pairs = []
+    for key in itemKeys:
+        if not key in items.schema.keys():
+            continue
+        fieldKeys = list(items.schema[key].keys()) if fieldKey is None else [fieldKey]
+        pairs += [(key, field) for field in fieldKeys if field in items.schema[key].keys()]
+    return pairs
+
+def _projects(args):
+    '''Load each project in turn, or all of them merged into one, reporting the ones which cannot be read'''
+    if args.merge:
+        try:
+            yield MERGED_NAME, loadFiles(args.projects,args.separate,args.overlap.capitalize())
+        except Exception as error:
+            print(f'{MERGED_NAME}: {error}',file=sys.stderr)
+            yield MERGED_NAME, None
+        return
+    for fileName in args.projects:
+        try:
+            yield fileName, loadFile(fileName)
+        except Exception as error:
+            print(f'{fileName}: {error}',file=sys.stderr)
+            yield fileName, None
+
+def statsCommand(args) -> int:
+    startDay, endDay = _range(args)
+    status = 0
+    for fileName, items in _projects(args):
+        if items is None:
+            status = 1
+            continue
+        for itemKey, fieldKey in _pairs(items,args.activity,args.field):
+            if args.aggregate=='daily':
+                stats = items.rangeStats(itemKey,fieldKey,startDay,endDay)
+            else:
+                stats = valueStats(items.aggregate(itemKey,fieldKey,args.aggregate.capitalize(),args.aggregateFunction.capitalize(),startDay,endDay)[1])
+            unit = items.unit(itemKey,fieldKey)
+            if args.json:
+                print(json.dumps({'project': fileName, 'activity': itemKey, 'field': fieldKey, 'unit': unit, 'stats': stats}))
+            elif stats is None:
+                print(f'{fileName}\t{itemKey}\t{fieldKey}\tno entries')
+            else:
+                print(f'{fileName}\t{itemKey}\t{fieldKey}\t' + '\t'.join(f'{key}={stats[key]:.1f}' for key in ['mean','max','min','median','std','total']) + f'\t{unit}')
+    return status
+
+def _writeRows(f, items: activityStore, pairs: list, startDay, endDay):
+    writer = csv.writer(f)
+    for itemKey, fieldKey in pairs:
+        plotDays, values = items.series(itemKey,fieldKey,startDay,endDay)
+        unit = items.unit(itemKey,fieldKey)
+        writer.writerows((dateFromJulianDay(int(day)).isoformat(), itemKey, fieldKey, repr(float(value)), unit) for day, value in zip(plotDays, values))
+
+def exportCommand(args) -> int:
+    '''Write the selected fields as long format CSV, one file per project'''
+    startDay, endDay = _range(args)
+    status = 0
+    if args.output=='-':
+        csv.writer(sys.stdout).writerow(['date','activity','field','value','unit'])
+    for fileName, items in _projects(args):
+        if items is None:
+            status = 1
+            continue
+        pairs = _pairs(items,args.activity,args.field)
+        if args.output=='-':
+            _writeRows(sys.stdout,items,pairs,startDay,endDay)
+            continue
+        os.makedirs(args.output,exist_ok=True)
+        with open(os.path.join(args.output,f'{projectName(fileName)}.csv'),'w',newline='') as f:
+            csv.writer(f).writerow(['date','activity','field','value','unit'])
+            _writeRows(f,items,pairs,startDay,endDay)
+    return status
+
+def plotCommand(args) -> int:
+    '''Render one PNG per project and selected field with the Agg backend, in parallel'''
+    from activityplot import exportPlots
+    startDay, endDay = _range(args)
+    today = julianDay(datetime.date.today())
+    status = 0
+    for fileName, items in _projects(args):
+        if items is None:
+            status = 1
+            continue
+        name = projectName(fileName)
+        pdfName = os.path.join(args.output,f'{name}.pdf') if args.pdf else None
+        imNames, pdfName = exportPlots(items,_pairs(items,args.activity,args.field),startDay,endDay,args.type.capitalize(),today,args.output,args.aggregate.capitalize(),args.aggregateFunction.capitalize(),pdfName,f'{name}_')
+        for imName in imNames:
+            print(imName)
+        if pdfName is not None:
+            print(pdfName)
+    return status
+
+def importCommand(args) -> int:
+    '''Add CSV files to a project, a new one when it does not exist, and save it'''
+    items = loadFile(args.project) if os.path.exists(args.project) else activityStore()
+    count = importCsv(args.files,items,args.overlap.capitalize())
+    saveFile(args.output or args.project,items)
+    print(f'{count} rows imported into {args.output or args.project}')
+    return 0
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='activitytracker.py',description='Headless commands, run without arguments to start the program')
+    subparsers = parser.add_subparsers(dest='command',required=True)
+    commands = {
+        'stats': (statsCommand, 'Print range statistics of each field'),
+        'export': (exportCommand, 'Export fields as CSV (date, activity, field, value, unit)'),
+        'plot': (plotCommand, 'Save plots of each field as PNG'),
+        }
+    for name, (function, helpText) in commands.items():
+        subparser = subparsers.add_parser(name,help=helpText)
+        subparser.set_defaults(function=function)
+        subparser.add_argument('projects',nargs='+',help='project files or partitioned project directories')
+        subparser.add_argument('-a','--activity',help='only this activity')
+        subparser.add_argument('-f','--field',help='only this field')
+        subparser.add_argument('-r','--range',choices=list(RANGE_CHOICES.keys()),default='all',help='last 7 days, last 30 days or all time')
+        subparser.add_argument('--start',type=_dateArg,help='first day of a custom range (YYYY-MM-DD)')
+        subparser.add_argument('--end',type=_dateArg,help='last day of a custom range (YYYY-MM-DD)')
+        subparser.add_argument('--merge',action='store_true',help=f"treat all projects as one, named '{MERGED_NAME}'")
+        subparser.add_argument('--separate',action='store_true',help='with --merge, keep activities of each project apart as <project>/<activity>')
+        subparser.add_argument('--overlap',choices=[overlap.lower() for overlap in MERGE_OVERLAPS],default='sum',help='with --merge, how entries of the same day, activity and field are combined')
+    importParser = subparsers.add_parser('import',help='Add CSV files (date, activity, field, value, unit) to a project')
+    importParser.set_defaults(function=importCommand)
+    importParser.add_argument('project',help='project file or partitioned project directory, created when missing')
+    importParser.add_argument('files',nargs='+',help='CSV files, the unit column may be left out')
+    importParser.add_argument('--overlap',choices=[overlap.lower() for overlap in MERGE_OVERLAPS],default='last',help='how values of a day, activity and field already present are combined')
+    importParser.add_argument('-o','--output',help='save to this project instead')
+    commandParsers = subparsers.choices
+    commandParsers['stats'].add_argument('--json',action='store_true',help='print one JSON object per line')
+    for name in ['stats','plot']:
+        commandParsers[name].add_argument('--aggregate',choices=[aggregation.lower() for aggregation in AGGREGATIONS],default='daily',help='combine the values of each week, month or year')
+        commandParsers[name].add_argument('--function',dest='aggregateFunction',choices=[function.lower() for function in AGGREGATE_FUNCTIONS],default='sum',help='how values are combined by --aggregate')
+    commandParsers['export'].add_argument('-o','--output',default='.',help="output directory, '-' for standard output")
+    commandParsers['plot'].add_argument('-o','--output',default='.',help='output directory')
+    commandParsers['plot'].add_argument('-t','--type',choices=['bar','line','scatter'],default='bar',help='plot type')
+    commandParsers['plot'].add_argument('--pdf',action='store_true',help='also write every plot of a project as a page of <project>.pdf')
+    return parser
+
+def main(argv: list) -> int:
+    '''Run a headless command'''
+    args = _parser().parse_args(argv)
+    return args.function(args)
+
+if (__name__=='__main__'):
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,64 @@
+"""
+Copyright (C) 2023  Craig S. Chisholm
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy as np
+import pyqtgraph as pg
+import pyqtgraph.exporters
+from activityplot import downsample, BAR_WIDTH
+
+#matplotlib's default colour, so both backends look alike
+PLOT_COLOUR = '#1f77b4'
+
+class pyqtgraphRenderer:
+    '''Plots one field with pyqtgraph, which stays responsive when panning and zooming over long ranges'''
+    def __init__(self):
+        self.widget = pg.PlotWidget(background='w')
+        self.plotItem = self.widget.getPlotItem()
+        self.plotItem.setLabel('bottom','Day')
+        self.bars = pg.BarGraphItem(x=np.zeros(0),height=np.zeros(0),width=BAR_WIDTH,brush=PLOT_COLOUR,pen=None)
+        self.line = pg.PlotDataItem(pen=pg.mkPen(PLOT_COLOUR),symbol='o',symbolBrush=PLOT_COLOUR,symbolPen=None,symbolSize=6)
+        self.line.setDownsampling(auto=True,method='peak')
+        self.line.setClipToView(True)
+        self.scatter = pg.ScatterPlotItem(brush=PLOT_COLOUR,pen=None,size=6)
+        for item in (self.bars, self.line, self.scatter):
+            self.plotItem.addItem(item)
+        self.clear()
+
+    def clear(self):
+        self.plotItem.setVisible(False)
+
+    def update(self, plotX: np.ndarray, plotY: np.ndarray, plotMode: str, ylabel: str, span: float = 1.):
+        '''Show one field against day offset, each value covering span days, zero entries are hidden in Line and Scatter mode'''
+        if plotMode!='Bar':
+            plotX, plotY = plotX[plotY>0], plotY[plotY>0]
+        self.bars.setVisible(plotMode=='Bar')
+        self.line.setVisible(plotMode=='Line')
+        self.scatter.setVisible(plotMode=='Scatter')
+        if (plotMode=='Bar'):
+            plotX, plotY = downsample(plotX,plotY,max(int(self.widget.width()),1))
+            self.bars.setOpts(x=plotX,height=plotY,width=BAR_WIDTH*span)
+        elif (plotMode=='Line'):
+            self.line.setData(plotX,plotY)
+        elif (plotMode=='Scatter'):
+            plotX, plotY = downsample(plotX,plotY,max(int(self.widget.width()),1))
+            self.scatter.setData(plotX,plotY)
+        self.plotItem.setLabel('left',ylabel)
+        self.plotItem.autoRange()
+        self.plotItem.setVisible(True)
+
+    def export(self, fileName: str):
+        pyqtgraph.exporters.ImageExporter(self.plotItem).export(fileName)
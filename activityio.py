@@ -0,0 +1,593 @@
+"""
+Copyright (C) 2023  Craig S. Chisholm
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sys
+import csv
+import json
+import os
+import zlib
+import codecs
+import struct
+import datetime
+import threading
+import multiprocessing
+import concurrent.futures
+import numpy as np
+from activitystore import activityStore, UNIX_EPOCH_JULIAN_DAY
+from activityprofile import timed
+
+#Edits since the last full save are appended to <project>.journal, the
+#project file itself is only rewritten once the journal grows past JOURNAL_LIMIT
+JOURNAL_SUFFIX = '.journal'
+JOURNAL_LIMIT = 256*1024
+
+#Bytes read at a time when streaming a JSON project
+STREAM_CHUNK = 64*1024
+
+#A partitioned project is a directory holding MANIFEST_NAME, with the schema, the
+#first day each activity and field was used and the day range, plus one JSON file
+#per year (or month) in the usual day->item->field layout
+MANIFEST_NAME = 'manifest.json'
+PARTITIONED_FORMAT = 'activitytracker-partitioned'
+
+#Every manifest starts with its format, which is how a manifest is told apart
+#from any other file called MANIFEST_NAME
+MANIFEST_PREFIX = json.dumps({'format': PARTITIONED_FORMAT})[:-1].encode()
+PARTITIONED_VERSION = 1
+
+#A binary project is BINARY_MAGIC, the format version and the length of a JSON
+#header (schema, first day, number of days, column order), padded to
+#BINARY_ALIGN bytes, followed by one little endian float64 array per
+#(activity, field), NaN where absent, then uint8 masks of the days and of each activity
+BINARY_SUFFIX = '.atcol'
+BINARY_MAGIC = b'ATCOLS\x00\x00'
+BINARY_VERSION = 1
+BINARY_ALIGN = 64
+
+#Long format CSV (date, activity, field, value, unit) as written by the export
+#command, read CSV_CHUNK bytes at a time, the unit column is optional
+CSV_COLUMNS = ['date', 'activity', 'field', 'value', 'unit']
+CSV_CHUNK = 2**20
+
+#QDate.toJulianDay() minus datetime.date.toordinal()
+JULIAN_ORDINAL_OFFSET = 1721425
+
+def julianDay(date: datetime.date) -> int:
+    return date.toordinal() + JULIAN_ORDINAL_OFFSET
+
+def dateFromJulianDay(day: int) -> datetime.date:
+    return datetime.date.fromordinal(day - JULIAN_ORDINAL_OFFSET)
+
+def partitionKey(day: int, granularity: str) -> str:
+    date = dateFromJulianDay(day)
+    if granularity=='month':
+        return f'{date.year}-{date.month:02d}'
+    return f'{date.year}'
+
+def partitionRange(key: str, granularity: str) -> tuple:
+    '''First and last Julian day covered by a partition'''
+    if granularity=='month':
+        year, month = [int(x) for x in key.split('-')]
+        nextYear, nextMonth = (year+1, 1) if month==12 else (year, month+1)
+    else:
+        year, month = int(key), 1
+        nextYear, nextMonth = year+1, 1
+    return julianDay(datetime.date(year,month,1)), julianDay(datetime.date(nextYear,nextMonth,1))-1
+
+class partitionLoader:
+    '''Reads the partitions of a partitioned project the first time one of their days is needed'''
+    def __init__(self, dirName: str, granularity: str, partitions: list):
+        self.dirName = dirName
+        self.granularity = granularity
+        self.unloaded = {key: partitionRange(key,granularity) for key in partitions}
+        self.lock = threading.Lock()
+
+    def unloadedRanges(self) -> list:
+        '''Day ranges of partitions not yet read, latest first'''
+        return sorted(list(self.unloaded.values()), reverse=True)
+
+    def _overlapping(self, firstDay, lastDay) -> list:
+        return sorted(key for key, (first, last) in list(self.unloaded.items()) if (firstDay is None or last>=firstDay) and (lastDay is None or first<=lastDay))
+
+    def ensure(self, items: activityStore, firstDay, lastDay):
+        '''Read the partitions covering [firstDay, lastDay], a worker may be reading others meanwhile
+        so a partition is only marked loaded once its days are in the store'''
+        if not len(self._overlapping(firstDay, lastDay)):
+            return
+        with self.lock:
+            for key in self._overlapping(firstDay, lastDay):
+                with open(os.path.join(self.dirName,f'{key}.json'),'r') as f:
+                    items.loadDict(json.loads(f.read()))
+                del self.unloaded[key]
+            if not len(self.unloaded):
+                items.loader = None
+
+def _writeAtomic(fileName: str, data: bytes):
+    tmpName = f'{fileName}.tmp'
+    with open(tmpName,'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmpName,fileName)
+
+def _readJournal(journalName: str, baseCrc: int):
+    '''Records of a journal written on top of the snapshot with checksum baseCrc, None if it belongs to another snapshot'''
+    with open(journalName,'r') as f:
+        lines = f.readlines()
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError: #Torn write from an interrupted save
+            continue
+    if not len(records) or records[0].get('op')!='base' or records[0].get('crc')!=baseCrc:
+        return None
+    return records[1:]
+
+def compactFile(fileName: str, items: activityStore):
+    '''Write a full snapshot of items and discard the journal'''
+    data = json.dumps(items.toDict()).encode()
+    _writeAtomic(fileName,data)
+    journalName = fileName + JOURNAL_SUFFIX
+    if os.path.exists(journalName):
+        os.remove(journalName)
+    items.baseFile = fileName
+    items.baseCrc = zlib.crc32(data)
+    items.pending.clear()
+    items.markSaved()
+
+def _isManifest(fileName: str) -> bool:
+    if not os.path.isfile(fileName):
+        return False
+    with open(fileName,'rb') as f:
+        return f.read(len(MANIFEST_PREFIX))==MANIFEST_PREFIX
+
+def isPartitioned(fileName: str) -> bool:
+    '''Whether fileName is an existing partitioned project, either its manifest or its directory'''
+    return _isManifest(_manifestName(fileName))
+
+def _savesPartitioned(fileName: str) -> bool:
+    '''Whether saving to fileName writes a partitioned project: a directory, or a manifest which is new or already one'''
+    if os.path.isdir(fileName):
+        return True
+    return os.path.basename(fileName)==MANIFEST_NAME and (not os.path.exists(fileName) or _isManifest(fileName))
+
+def checkPartitionedTarget(fileName: str):
+    '''Raise ValueError unless a new partitioned project can be written to fileName without overwriting other files'''
+    manifestName = _manifestName(fileName)
+    dirName = os.path.dirname(manifestName)
+    if os.path.isdir(dirName) and len(os.listdir(dirName)) and not _isManifest(manifestName):
+        raise ValueError(f'{dirName} is not empty and holds no partitioned project, choose an empty or new directory')
+
+def _manifestName(fileName: str) -> str:
+    if os.path.isdir(fileName):
+        return os.path.join(fileName,MANIFEST_NAME)
+    return fileName
+
+def _fieldSince(items: activityStore) -> dict:
+    '''First use day of each field as activity->field->day, for JSON'''
+    fieldSince = {itemKey: {} for itemKey in items.schema.keys()}
+    for (itemKey, fieldKey), day in items.fieldSince.items():
+        fieldSince[itemKey][fieldKey] = day
+    return fieldSince
+
+def loadPartitioned(fileName: str) -> activityStore:
+    '''Open a partitioned project, partitions are only read once their days are touched'''
+    manifestName = _manifestName(fileName)
+    with open(manifestName,'r') as f:
+        manifest = json.loads(f.read())
+    if manifest.get('format')!=PARTITIONED_FORMAT:
+        raise ValueError(f'{manifestName} is not a partitioned project manifest')
+    if manifest['version']>PARTITIONED_VERSION:
+        raise ValueError(f'{manifestName} was written by a newer version (format {manifest["version"]})')
+    items = activityStore()
+    items.loadSchema(manifest['schema'],manifest['itemSince'],manifest['fieldSince'])
+    if manifest['firstDay'] is not None:
+        items.reserve(manifest['firstDay'],manifest['lastDay'])
+    if len(manifest['partitions']):
+        items.loader = partitionLoader(os.path.dirname(manifestName),manifest['partition'],manifest['partitions'])
+    items.baseFile = manifestName
+    items.markSaved()
+    return items
+
+def savePartitioned(fileName: str, items: activityStore, granularity: str = 'year'):
+    '''Write only the partitions touched since the last save, or every partition for a new project'''
+    manifestName = _manifestName(fileName)
+    dirName = os.path.dirname(manifestName)
+    manifest = None
+    if items.baseFile==manifestName and os.path.exists(manifestName):
+        with open(manifestName,'r') as f:
+            manifest = json.loads(f.read())
+    if manifest is None:
+        checkPartitionedTarget(manifestName)
+        os.makedirs(dirName,exist_ok=True)
+        days = [int(day) for day in items.days()]
+        keys = sorted({partitionKey(day,granularity) for day in days})
+        partitions = keys
+    else:
+        granularity = manifest['partition']
+        days = [record['day'] for record in items.pending]
+        if manifest['firstDay'] is not None:
+            days += [manifest['firstDay'],manifest['lastDay']]
+        keys = sorted({partitionKey(record['day'],granularity) for record in items.pending})
+        partitions = sorted(set(manifest['partitions']) | set(keys))
+    for key in keys:
+        firstDay, lastDay = partitionRange(key,granularity)
+        _writeAtomic(os.path.join(dirName,f'{key}.json'),json.dumps(items.toDict(firstDay,lastDay)).encode())
+    manifest = {
+        'format': PARTITIONED_FORMAT,
+        'version': PARTITIONED_VERSION,
+        'partition': granularity,
+        'schema': items.schema,
+        'itemSince': items.itemSince,
+        'fieldSince': _fieldSince(items),
+        'firstDay': min(days) if len(days) else None,
+        'lastDay': max(days) if len(days) else None,
+        'partitions': partitions,
+        }
+    _writeAtomic(manifestName,json.dumps(manifest).encode())
+    items.baseFile = manifestName
+    items.baseCrc = None
+    items.pending.clear()
+    items.markSaved()
+
+def isBinary(fileName: str) -> bool:
+    if not os.path.isfile(fileName):
+        return False
+    with open(fileName,'rb') as f:
+        return f.read(len(BINARY_MAGIC))==BINARY_MAGIC
+
+def loadBinary(fileName: str) -> activityStore:
+    '''Open a binary project, the columns are memory mapped copy on write so nothing is read until used'''
+    with open(fileName,'rb') as f:
+        magic, version, headerSize = struct.unpack('<8sII',f.read(16))
+        if magic!=BINARY_MAGIC:
+            raise ValueError(f'{fileName} is not a binary project')
+        if version>BINARY_VERSION:
+            raise ValueError(f'{fileName} was written by a newer version (format {version})')
+        header = json.loads(f.read(headerSize))
+    offset = BINARY_ALIGN*(-(-(16 + headerSize)//BINARY_ALIGN))
+    count = header['days']
+    def array(dtype):
+        nonlocal offset
+        data = np.memmap(fileName,dtype=dtype,mode='c',offset=offset,shape=(count,)) if count else np.zeros(0,dtype=dtype)
+        offset += count*np.dtype(dtype).itemsize
+        return data
+    columns = {(itemKey, fieldKey): array('<f8') for itemKey, fieldKey in header['columns']}
+    dayMask = array(np.bool_)
+    itemMasks = {itemKey: array(np.bool_) for itemKey in header['items']}
+    items = activityStore()
+    fieldSince = {(itemKey, fieldKey): day for itemKey, fields in header['fieldSince'].items() for fieldKey, day in fields.items()}
+    items.loadArrays(header['schema'],header['start'],dayMask,itemMasks,columns,header['itemSince'],fieldSince)
+    items.baseFile = fileName
+    items.markSaved()
+    return items
+
+def _unmap(items: activityStore, fileName: str):
+    '''Copy the arrays of items mapped from fileName into memory, the file cannot be replaced while mapped on Windows'''
+    fileName = os.path.abspath(fileName)
+    def copy(array):
+        return np.array(array) if isinstance(array, np.memmap) and array.filename==fileName else array
+    items.columns = {key: copy(column) for key, column in items.columns.items()}
+    items.dayMask = copy(items.dayMask)
+    items.itemMasks = {key: copy(mask) for key, mask in items.itemMasks.items()}
+
+def saveBinary(fileName: str, items: activityStore):
+    '''Write the whole project in the binary format, trimmed to the populated days'''
+    days = items.days()
+    start = int(days[0]) if len(days) else 0
+    count = int(days[-1]) - start + 1 if len(days) else 0
+    first = start - items.start
+    def trim(array, dtype):
+        return np.ascontiguousarray(array[first:first+count],dtype=dtype).tobytes()
+    columns = [(itemKey, fieldKey) for itemKey, fields in items.schema.items() for fieldKey in fields.keys()]
+    header = json.dumps({
+        'start': start,
+        'days': count,
+        'schema': items.schema,
+        'columns': columns,
+        'items': list(items.schema.keys()),
+        'itemSince': items.itemSince,
+        'fieldSince': _fieldSince(items),
+        }).encode()
+    prefix = struct.pack('<8sII',BINARY_MAGIC,BINARY_VERSION,len(header)) + header
+    parts = [prefix + b' '*(-len(prefix)%BINARY_ALIGN)]
+    parts += [trim(items.columns[key],'<f8') for key in columns]
+    parts.append(trim(items.dayMask,np.uint8))
+    parts += [trim(items.itemMasks[itemKey],np.uint8) for itemKey in items.schema.keys()]
+    _unmap(items,fileName)
+    _writeAtomic(fileName,b''.join(parts))
+    items.baseFile = fileName
+    items.baseCrc = None
+    items.pending.clear()
+    items.markSaved()
+
+class _jsonDayStream:
+    '''Yields (day, activities) pairs from a day->item->field JSON file one day at a time'''
+    def __init__(self, f, progress=None):
+        self.f = f
+        self.progress = progress
+        self.size = max(os.fstat(f.fileno()).st_size,1)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.jsonDecoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.crc = 0
+
+    def _read(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(STREAM_CHUNK)
+        self.crc = zlib.crc32(chunk,self.crc)
+        self.eof = not len(chunk)
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(chunk,final=self.eof)
+        self.pos = 0
+        if self.progress is not None:
+            self.progress(self.f.tell()/self.size)
+        return True
+
+    def _skip(self) -> str:
+        '''Skip whitespace and return the next character, empty at the end of the file'''
+        while True:
+            while self.pos<len(self.buffer) and self.buffer[self.pos] in ' \t\n\r':
+                self.pos += 1
+            if self.pos<len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read():
+                return ''
+
+    def _expect(self, characters: str) -> str:
+        character = self._skip()
+        if not len(character) or not character in characters:
+            raise ValueError(f'Expected one of {characters!r} in project file, found {character!r}')
+        self.pos += 1
+        return character
+
+    def _value(self):
+        while True:
+            try:
+                value, end = self.jsonDecoder.raw_decode(self.buffer,self.pos)
+            except json.JSONDecodeError:
+                if not self._read():
+                    raise
+                continue
+            if end==len(self.buffer) and not self.eof: #A number could continue in the next chunk
+                self._read()
+                continue
+            self.pos = end
+            return value
+
+    def __iter__(self):
+        self._expect('{')
+        if self._skip()=='}':
+            self.pos += 1
+        else:
+            while True:
+                self._skip()
+                key = self._value()
+                self._expect(':')
+                self._skip()
+                yield int(key), self._value()
+                if self._expect(',}')=='}':
+                    break
+        while self._read(): #Finish the checksum of the whole file
+            pass
+
+def iterDays(fileName: str):
+    '''Stream the days of a JSON project without building the whole document'''
+    with open(fileName,'rb') as f:
+        yield from _jsonDayStream(f)
+
+def _streamJson(fileName: str, progress=None):
+    items = activityStore()
+    with open(fileName,'rb') as f:
+        stream = _jsonDayStream(f,progress)
+        for day, activities in stream:
+            items.loadDict({day: activities})
+    return items, stream.crc
+
+@timed
+def loadFile(fileName: str, progress=None) -> activityStore:
+    '''Open a project, progress is called with the fraction read so far'''
+    if isPartitioned(fileName):
+        return loadPartitioned(fileName)
+    if isBinary(fileName):
+        return loadBinary(fileName)
+    items, baseCrc = _streamJson(fileName,progress)
+    journalName = fileName + JOURNAL_SUFFIX
+    if os.path.exists(journalName):
+        records = _readJournal(journalName,baseCrc)
+        if records is None: #Compaction finished before the old journal was removed
+            os.remove(journalName)
+        else:
+            for record in records:
+                items.applyRecord(record)
+    items.baseFile = fileName
+    items.baseCrc = baseCrc
+    items.pending.clear()
+    items.markSaved()
+    return items
+
+@timed
+def saveFile(fileName: str, items: activityStore):
+    '''Append pending edits to the journal of fileName, falling back to a full write when needed'''
+    if _savesPartitioned(fileName):
+        savePartitioned(fileName,items)
+        return
+    if fileName.endswith(BINARY_SUFFIX):
+        saveBinary(fileName,items)
+        return
+    journalName = fileName + JOURNAL_SUFFIX
+    if items.baseFile!=fileName or not os.path.exists(fileName):
+        compactFile(fileName,items)
+        return
+    if os.path.exists(journalName) and os.path.getsize(journalName)>JOURNAL_LIMIT:
+        compactFile(fileName,items)
+        return
+    if not len(items.pending):
+        items.markSaved()
+        return
+    lines = [json.dumps(record) for record in items.pending]
+    if not os.path.exists(journalName) or not os.path.getsize(journalName):
+        lines.insert(0,json.dumps({'op': 'base', 'crc': items.baseCrc}))
+    else:
+        with open(journalName,'rb') as f:
+            f.seek(-1,os.SEEK_END)
+            if f.read(1)!=b'\n': #Start a fresh line after a torn write
+                lines.insert(0,'')
+    with open(journalName,'a') as f:
+        f.write('\n'.join(lines) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    items.pending.clear()
+    items.markSaved()
+
+def processPool(workers: int, initializer=None) -> concurrent.futures.ProcessPoolExecutor:
+    '''Pool of spawned worker processes, forking a process with running GUI threads is unsafe'''
+    context = multiprocessing.get_context('spawn')
+    return concurrent.futures.ProcessPoolExecutor(max_workers=min(workers,os.cpu_count() or 1),mp_context=context,initializer=initializer)
+
+def _loadColumns(fileName: str) -> dict:
+    '''Runs in a worker process, the project as plain arrays which pickle cheaply'''
+    items = loadFile(fileName)
+    items.ensure()
+    return {
+        'schema': items.schema,
+        'start': items.start,
+        'dayMask': np.array(items.dayMask),
+        'itemMasks': {key: np.array(mask) for key, mask in items.itemMasks.items()},
+        'columns': {key: np.array(column) for key, column in items.columns.items()},
+        'itemSince': items.itemSince,
+        'fieldSince': items.fieldSince,
+        }
+
+def loadFiles(fileNames: list, separate: bool = False, overlap: str = 'Sum', progress=None) -> activityStore:
+    '''Read several projects in parallel worker processes and merge them in order into a new project
+
+    With separate, activities are kept apart as "<project>/<activity>", otherwise
+    activities of the same name are merged and overlap decides how entries present
+    in more than one project are combined.
+    '''
+    items = activityStore()
+    names = [projectName(fileName) for fileName in fileNames]
+    if len(fileNames)==1:
+        parts = {0: _loadColumns(fileNames[0])}
+    else:
+        parts = {}
+        with processPool(len(fileNames)) as pool:
+            futures = {pool.submit(_loadColumns,fileName): index for index, fileName in enumerate(fileNames)}
+            for future in concurrent.futures.as_completed(futures):
+                parts[futures[future]] = future.result()
+                if progress is not None:
+                    progress(len(parts)/len(fileNames))
+    for index in range(len(fileNames)):
+        part = activityStore()
+        part.loadArrays(**parts[index])
+        items.merge(part,f'{names[index]}/' if separate else '',overlap)
+    return items
+
+def _importRows(items: activityStore, rows: list, overlap: str, unitless: set) -> int:
+    '''Parse one chunk of CSV rows column by column and write each (activity, field, unit) group at once
+
+    unitless holds the fields this import created from rows without a unit, they
+    take the unit of the first row of the same field which has one.
+    '''
+    lengths = set(map(len, rows))
+    if not lengths<={0, len(CSV_COLUMNS)-1, len(CSV_COLUMNS)}:
+        raise ValueError(f'Expected the columns {", ".join(CSV_COLUMNS)}')
+    if lengths!={len(CSV_COLUMNS)}: #Blank lines, or rows without a unit
+        rows = [row + [''] if len(row)==len(CSV_COLUMNS)-1 else row for row in rows if len(row)]
+    if not len(rows):
+        return 0
+    dates, itemKeys, fieldKeys, values, units = [list(map(str.strip, [row[column] for row in rows])) for column in range(len(CSV_COLUMNS))]
+    days = np.array(dates, dtype='datetime64[D]').astype(np.int64) + UNIX_EPOCH_JULIAN_DAY
+    values = np.array(values, dtype=float)
+    #Number the distinct names of each column, then the distinct combinations
+    names, codes = zip(*(np.unique(np.array(column), return_inverse=True) for column in (itemKeys, fieldKeys, units)))
+    shape = tuple(len(columnNames) for columnNames in names)
+    groups, group = np.unique(np.ravel_multi_index(codes, shape), return_inverse=True)
+    order = np.argsort(group, kind='stable')
+    bounds = np.searchsorted(group[order], np.arange(len(groups)+1))
+    keys = [(str(names[0][itemIndex]), str(names[1][fieldIndex]), str(names[2][unitIndex]), order[first:last])
+            for itemIndex, fieldIndex, unitIndex, first, last in zip(*np.unravel_index(groups, shape), bounds[:-1], bounds[1:])]
+    #Rows without a unit go last, so they find the unit of the rows of the same field with one
+    for itemKey, fieldKey, unit, index in sorted(keys, key=lambda key: key[2]==''):
+        if unit=='':
+            if not fieldKey in items.schema.get(itemKey, {}).keys():
+                unitless.add((itemKey, fieldKey))
+            unit = items.schema.get(itemKey, {}).get(fieldKey, '')
+        elif (itemKey, fieldKey) in unitless:
+            items.schema[itemKey][fieldKey] = unit
+            unitless.discard((itemKey, fieldKey))
+        items.importValues(itemKey,fieldKey,unit,days[index],values[index],overlap)
+    return len(rows)
+
+@timed
+def importCsv(fileNames: list, items: activityStore, overlap: str = 'Last', progress=None) -> int:
+    '''Add long format CSV files to items, a chunk of rows at a time, and return the number of rows read
+
+    Missing activities and fields are created. Values of a day, activity and field
+    given more than once, or already in items, are combined by overlap, one of MERGE_OVERLAPS.
+    '''
+    total = sum(os.path.getsize(fileName) for fileName in fileNames)
+    done = 0
+    count = 0
+    unitless = set()
+    for fileName in fileNames:
+        with open(fileName,'r',newline='',encoding='utf-8-sig') as f: #Spreadsheets start UTF-8 files with a byte order mark
+            header = True
+            while True:
+                lines = f.readlines(CSV_CHUNK)
+                if not len(lines):
+                    break
+                rows = list(csv.reader(lines))
+                if header and len(rows) and len(rows[0]) and rows[0][0].strip().lower()==CSV_COLUMNS[0]:
+                    rows = rows[1:]
+                header = False
+                try:
+                    count += _importRows(items,rows,overlap,unitless)
+                except ValueError as error:
+                    raise ValueError(f'{fileName}: {error}')
+                done += sum(map(len, lines)) #Characters, close enough to bytes for progress
+                if progress is not None and total:
+                    progress(min(done/total, 1.))
+    return count
+
+def projectName(fileName: str) -> str:
+    '''Name of a project file or partitioned project directory, without the extension'''
+    if os.path.isdir(fileName):
+        return os.path.basename(os.path.normpath(fileName))
+    if isPartitioned(fileName):
+        return os.path.basename(os.path.dirname(os.path.abspath(fileName)))
+    return os.path.splitext(os.path.basename(fileName))[0]
+
+def convertFile(fileName: str, newFileName: str):
+    '''Convert a project, newFileName is a partitioned project directory unless it ends in .json or BINARY_SUFFIX'''
+    if not newFileName.endswith(('.json', BINARY_SUFFIX)) and not os.path.basename(newFileName)==MANIFEST_NAME:
+        newFileName = os.path.join(newFileName,MANIFEST_NAME)
+    saveFile(newFileName,loadFile(fileName))
+
+def main():
+    '''Convert a project from the command line'''
+    if len(sys.argv)!=3:
+        print(f'Usage: python {os.path.basename(sys.argv[0])} <project> <new project directory, .json or {BINARY_SUFFIX} file>',file=sys.stderr)
+        sys.exit(2)
+    convertFile(sys.argv[1],sys.argv[2])
+
+if (__name__=='__main__'):
+    main()
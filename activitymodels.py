@@ -0,0 +1,148 @@
+"""
+Copyright (C) 2023  Craig S. Chisholm
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from PyQt5.QtCore import Qt, QModelIndex, QAbstractListModel, QAbstractTableModel
+from PyQt5.QtWidgets import QStyledItemDelegate, QLineEdit
+from activitystore import activityStore
+
+def _beginResize(model, rowCount: int, newRowCount: int):
+    '''Start inserting or removing rows at the end, so views keep their selection, and return the matching end call'''
+    if newRowCount>rowCount:
+        model.beginInsertRows(QModelIndex(),rowCount,newRowCount-1)
+        return model.endInsertRows
+    if newRowCount<rowCount:
+        model.beginRemoveRows(QModelIndex(),newRowCount,rowCount-1)
+        return model.endRemoveRows
+    return None
+
+class activityListModel(QAbstractListModel):
+    '''Activity names shown for the current day'''
+    def __init__(self):
+        super().__init__()
+        self.keys = []
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.keys)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() and role in (Qt.DisplayRole, Qt.EditRole):
+            return self.keys[index.row()]
+        return None
+
+    def setActivities(self, keys: list):
+        '''Show keys, only the rows which change are signalled'''
+        if keys==self.keys:
+            return
+        endResize = _beginResize(self,len(self.keys),len(keys))
+        changed = [row for row in range(min(len(keys),len(self.keys))) if keys[row]!=self.keys[row]]
+        self.keys = list(keys)
+        if endResize is not None:
+            endResize()
+        if len(changed):
+            self.dataChanged.emit(self.index(changed[0]),self.index(changed[-1]))
+
+class fieldTableModel(QAbstractTableModel):
+    '''Name, value and unit of the fields of one activity on one day
+
+    Values typed into the view are held in edits until commit() writes them to the store,
+    matching the Update fields button.
+    '''
+    HEADERS = ['Field', 'Value', 'Unit']
+    VALUE_COLUMN = 1
+
+    def __init__(self):
+        super().__init__()
+        self.items = None
+        self.day = None
+        self.itemKey = None
+        self.keys = []
+        self.edits = {}
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.keys)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section: int, orientation, role=Qt.DisplayRole):
+        if orientation==Qt.Horizontal and role==Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.column()==self.VALUE_COLUMN:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not role in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        fieldKey = self.keys[index.row()]
+        if index.column()==0:
+            return fieldKey
+        if index.column()==self.VALUE_COLUMN:
+            return str(self.value(fieldKey))
+        return self.items.unit(self.itemKey,fieldKey)
+
+    def setData(self, index, value, role=Qt.EditRole) -> bool:
+        if not index.isValid() or index.column()!=self.VALUE_COLUMN or role!=Qt.EditRole:
+            return False
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return False
+        self.edits[self.keys[index.row()]] = value
+        self.dataChanged.emit(index,index)
+        return True
+
+    def value(self, fieldKey: str) -> float:
+        '''Typed value of a field, or the stored one'''
+        if fieldKey in self.edits.keys():
+            return self.edits[fieldKey]
+        return self.items.value(self.day,self.itemKey,fieldKey)
+
+    def setFields(self, items: activityStore, day: int, itemKey, keys: list):
+        '''Show keys of itemKey on day, rows are inserted or removed at the end and the rest only signalled as changed'''
+        if items is not self.items or day!=self.day or itemKey!=self.itemKey:
+            self.edits.clear()
+        endResize = _beginResize(self,len(self.keys),len(keys))
+        self.items = items
+        self.day = day
+        self.itemKey = itemKey
+        self.keys = list(keys)
+        if endResize is not None:
+            endResize()
+        if len(self.keys):
+            self.dataChanged.emit(self.index(0,0),self.index(len(self.keys)-1,len(self.HEADERS)-1))
+
+    def commit(self):
+        '''Write the typed values to the store'''
+        for fieldKey, value in self.edits.items():
+            self.items.setValue(self.day,self.itemKey,fieldKey,value)
+        self.edits.clear()
+
+class valueDelegate(QStyledItemDelegate):
+    '''Plain text editor for field values, the model rejects text which is not a number'''
+    def createEditor(self, parent, option, index):
+        return QLineEdit(parent)
+
+    def setEditorData(self, editor, index):
+        editor.setText(index.data(Qt.EditRole))
+
+    def setModelData(self, editor, model, index):
+        model.setData(index,editor.text(),Qt.EditRole)
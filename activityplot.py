@@ -0,0 +1,195 @@
+"""
+Copyright (C) 2023  Craig S. Chisholm
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import re
+import concurrent.futures
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.collections import PolyCollection
+from activitystore import activityStore, binCentres, AGGREGATION_DAYS
+from activityio import processPool
+
+#Size of the plot area in the main window
+PLOT_FIGSIZE = (6.5, 4.5)
+PLOT_DPI = 100
+
+#Width of a bar in days, as for Axes.bar
+BAR_WIDTH = 0.8
+
+def downsample(plotX: np.ndarray, plotY: np.ndarray, buckets: int) -> tuple:
+    '''Keep only the lowest and highest point in each of buckets equal slices of the (sorted) x range'''
+    if len(plotX)<=2*buckets or plotX[-1]==plotX[0]:
+        return plotX, plotY
+    bucket = ((plotX - plotX[0])*(buckets/(plotX[-1] - plotX[0]))).astype(int)
+    np.minimum(bucket,buckets-1,out=bucket)
+    order = np.lexsort((plotY,bucket))
+    orderedBuckets = bucket[order]
+    starts = np.flatnonzero(np.r_[True, orderedBuckets[1:]!=orderedBuckets[:-1]])
+    ends = np.r_[starts[1:], len(order)] - 1
+    keep = np.unique(np.concatenate((order[starts], order[ends])))
+    return plotX[keep], plotY[keep]
+
+def barVertices(plotX: np.ndarray, plotY: np.ndarray, width: float = BAR_WIDTH) -> np.ndarray:
+    '''Corners of one rectangle per value, shaped for a PolyCollection'''
+    vertices = np.empty((len(plotX), 4, 2))
+    vertices[:, :2, 0] = (plotX - width/2)[:, None]
+    vertices[:, 2:, 0] = (plotX + width/2)[:, None]
+    vertices[:, [0, 3], 1] = 0.
+    vertices[:, 1, 1] = plotY
+    vertices[:, 2, 1] = plotY
+    return vertices
+
+def _limits(low: float, high: float, pad: float) -> tuple:
+    margin = (high - low)*0.05 if high>low else pad
+    return low - margin, high + margin
+
+class figureRenderer:
+    '''Plots one field on a matplotlib figure, keeping the axes and artists and only swapping their data
+
+    Bars are a single PolyCollection and long ranges are reduced to the minimum
+    and maximum of each pixel column before being handed to matplotlib.
+    '''
+    def __init__(self, figure: Figure):
+        self.figure = figure
+        self.ax = figure.add_subplot(111)
+        self.bars = PolyCollection([],facecolors='C0')
+        self.ax.add_collection(self.bars)
+        self.line = self.ax.plot([],[],marker='o',color='C0')[0]
+        self.scatter = self.ax.scatter([],[],color='C0')
+        self.ax.set_xlabel('Day')
+        self.clear()
+
+    def clear(self):
+        self.ax.set_visible(False)
+        self.figure.canvas.draw_idle()
+
+    def update(self, plotX: np.ndarray, plotY: np.ndarray, plotMode: str, ylabel: str, span: float = 1.):
+        '''Show one field against day offset, each value covering span days, zero entries are hidden in Line and Scatter mode'''
+        width = BAR_WIDTH*span
+        if plotMode!='Bar':
+            plotX, plotY = plotX[plotY>0], plotY[plotY>0]
+        plotX, plotY = downsample(plotX,plotY,max(int(self.ax.bbox.width),1))
+        self.bars.set_visible(plotMode=='Bar')
+        self.line.set_visible(plotMode=='Line')
+        self.scatter.set_visible(plotMode=='Scatter')
+        if (plotMode=='Bar'):
+            self.bars.set_verts(barVertices(plotX,plotY,width))
+        elif (plotMode=='Line'):
+            self.line.set_data(plotX,plotY)
+        elif (plotMode=='Scatter'):
+            self.scatter.set_offsets(np.column_stack((plotX,plotY)))
+        if len(plotX):
+            self.ax.set_xlim(*_limits(plotX.min() - width/2,plotX.max() + width/2,1.))
+            low, high = plotY.min(), plotY.max()
+            if plotMode=='Bar':
+                low, high = min(low,0.), max(high,0.)
+            self.ax.set_ylim(*_limits(low,high,max(abs(high),1.)*0.05))
+        self.ax.set_ylabel(ylabel)
+        self.ax.set_visible(True)
+        self.figure.canvas.draw_idle()
+
+    def export(self, fileName: str):
+        self.figure.savefig(fileName)
+
+def _aggFigure() -> figureRenderer:
+    '''Renderer on a figure of the main window's plot size which draws without a display'''
+    figure = Figure(figsize=PLOT_FIGSIZE,dpi=PLOT_DPI)
+    FigureCanvasAgg(figure)
+    return figureRenderer(figure)
+
+def renderPlot(items: activityStore, itemKey: str, fieldKey: str, startDay, endDay, plotMode: str, today: int, fileName: str, aggregation: str = 'Daily', function: str = 'Sum') -> bool:
+    '''Save a plot of one field to an image file without a display, False if there is nothing to plot'''
+    plotDays, plotY = items.aggregate(itemKey,fieldKey,aggregation,function,startDay,endDay)
+    if not len(plotY):
+        return False
+    renderer = _aggFigure()
+    renderer.update(binCentres(plotDays,today,aggregation),plotY,plotMode,f'{fieldKey} ({items.unit(itemKey,fieldKey)})',AGGREGATION_DAYS[aggregation])
+    renderer.export(fileName)
+    return True
+
+def plotFileName(itemKey: str, fieldKey: str, prefix: str = '') -> str:
+    '''Image file name of one field, characters which are not safe in file names become _'''
+    return re.sub(r'[^\w.-]+','_',f'{prefix}{itemKey}_{fieldKey}') + '.png'
+
+def plotFileNames(pairs: list, prefix: str = '') -> list:
+    '''plotFileName of each (activity, field), numbered _2, _3... where they would clash, ignoring case as some file systems do'''
+    fileNames = []
+    taken = set()
+    for itemKey, fieldKey in pairs:
+        fileName = plotFileName(itemKey,fieldKey,prefix)
+        stem, number = fileName[:-len('.png')], 1
+        while fileName.lower() in taken:
+            number += 1
+            fileName = f'{stem}_{number}.png'
+        taken.add(fileName.lower())
+        fileNames.append(fileName)
+    return fileNames
+
+#The figure of a bulk export worker process, reused for every plot it renders
+_workerRenderer = None
+
+def _initWorker():
+    global _workerRenderer
+    _workerRenderer = _aggFigure()
+
+def _renderWorker(plot: tuple) -> str:
+    plotX, plotY, plotMode, ylabel, span, fileName = plot
+    _workerRenderer.update(plotX,plotY,plotMode,ylabel,span)
+    _workerRenderer.export(fileName)
+    return fileName
+
+def exportPlots(items: activityStore, pairs: list, startDay, endDay, plotMode: str, today: int, dirName: str, aggregation: str = 'Daily', function: str = 'Sum', pdfName=None, prefix: str = '', progress=None) -> tuple:
+    '''Save a PNG of every (activity, field) in pairs to dirName, and every plot as a page of pdfName when given,
+    return the PNG file names and the PDF name, None when it was not written as nothing had values in the range
+
+    The series are read here and the images rendered by a pool of processes, each
+    drawing on one Agg figure, while this process writes the PDF pages.
+    '''
+    os.makedirs(dirName,exist_ok=True)
+    plots = []
+    for (itemKey, fieldKey), fileName in zip(pairs, plotFileNames(pairs,prefix)):
+        plotDays, plotY = items.aggregate(itemKey,fieldKey,aggregation,function,startDay,endDay)
+        if len(plotY):
+            fileName = os.path.join(dirName,fileName)
+            ylabel = f'{itemKey}: {fieldKey} ({items.unit(itemKey,fieldKey)})'
+            plots.append((binCentres(plotDays,today,aggregation),plotY,plotMode,ylabel,AGGREGATION_DAYS[aggregation],fileName))
+    if not len(plots):
+        return [], None
+    steps = len(plots)*(2 if pdfName else 1)
+    done = 0
+    def advance():
+        nonlocal done
+        done += 1
+        if progress is not None:
+            progress(done/steps)
+    with processPool(len(plots),_initWorker) as pool:
+        futures = [pool.submit(_renderWorker,plot) for plot in plots]
+        if pdfName:
+            renderer = _aggFigure()
+            with PdfPages(pdfName) as pdf:
+                for plotX, plotY, plotMode, ylabel, span, fileName in plots:
+                    renderer.update(plotX,plotY,plotMode,ylabel,span)
+                    pdf.savefig(renderer.figure)
+                    advance()
+        fileNames = []
+        for future in concurrent.futures.as_completed(futures):
+            fileNames.append(future.result())
+            advance()
+    return sorted(fileNames), pdfName
@@ -0,0 +1,79 @@
+"""
+Copyright (C) 2023  Craig S. Chisholm
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import json
+import time
+import inspect
+import functools
+import threading
+import tracemalloc
+
+#Set ACTIVITYTRACKER_PROFILE=<trace file> to time the hot paths, the trace is in
+#Chrome trace event format (open it in chrome://tracing or https://ui.perfetto.dev)
+PROFILE_ENV = 'ACTIVITYTRACKER_PROFILE'
+TRACE_FILE = os.environ.get(PROFILE_ENV,'')
+ENABLED = len(TRACE_FILE)>0
+
+#Only this process writes the trace, spawned worker processes inherit the
+#environment and would otherwise truncate it when they import this module
+os.environ.pop(PROFILE_ENV,None)
+
+class profiler:
+    '''Call counts, times and net allocations per instrumented function, each call is also appended to the trace'''
+    def __init__(self, traceFile: str):
+        self.lock = threading.Lock()
+        self.totals = {}
+        self.started = time.perf_counter()
+        self.pid = os.getpid()
+        self.trace = open(traceFile,'w')
+        self.trace.write('[\n') #The closing bracket is optional in the trace event format
+        tracemalloc.start()
+
+    def record(self, name: str, started: float, duration: float, allocated: int):
+        with self.lock:
+            calls, total, longest, memory = self.totals.get(name,(0,0.,0.,0))
+            self.totals[name] = (calls+1, total+duration, max(longest,duration), memory+allocated)
+            event = {'name': name, 'cat': 'activitytracker', 'ph': 'X', 'pid': self.pid, 'tid': threading.get_ident(),
+                     'ts': round(1e6*(started-self.started)), 'dur': round(1e6*duration), 'args': {'allocated': allocated}}
+            self.trace.write(json.dumps(event) + ',\n')
+            self.trace.flush()
+
+    def summary(self) -> list:
+        '''(name, calls, total seconds, longest seconds, net bytes allocated), slowest first'''
+        with self.lock:
+            rows = [(name, *values) for name, values in self.totals.items()]
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+PROFILER = profiler(TRACE_FILE) if ENABLED else None
+
+def timed(function):
+    '''Instrument function when profiling is enabled, otherwise return it unchanged so it costs nothing'''
+    if not ENABLED:
+        return function
+    code = function.__code__
+    #Qt drops signal arguments a slot does not take, but cannot see through this wrapper
+    positional = None if code.co_flags & inspect.CO_VARARGS else code.co_argcount
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        memory = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        try:
+            return function(*args[:positional], **kwargs)
+        finally:
+            PROFILER.record(function.__qualname__,started,time.perf_counter()-started,tracemalloc.get_traced_memory()[0]-memory)
+    return wrapper
@@ -0,0 +1,733 @@
+"""
+Copyright (C) 2023  Craig S. Chisholm
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import bisect
+import collections
+import numpy as np
+
+#Minimum number of days allocated when a column has to grow
+MIN_CAPACITY = 64
+
+#Number of (activity, field, range) series kept by activityStore.series
+SERIES_CACHE_SIZE = 32
+
+PLOT_RANGES = ['Last 7 days', 'Last 30 days', 'All time', 'Custom']
+PLOT_TYPES = ['Bar','Line','Scatter']
+AGGREGATIONS = ['Daily', 'Weekly', 'Monthly', 'Yearly']
+AGGREGATE_FUNCTIONS = ['Sum', 'Mean', 'Max']
+
+#Average length of each aggregation bin in days, for bar widths
+AGGREGATION_DAYS = {'Daily': 1., 'Weekly': 7., 'Monthly': 30.44, 'Yearly': 365.25}
+
+#How an entry present in both projects being merged is combined
+MERGE_OVERLAPS = ['Sum', 'First', 'Last', 'Max']
+
+#Julian day of 1970-01-01, the epoch of numpy datetime64
+UNIX_EPOCH_JULIAN_DAY = 2440588
+
+def rangeDays(rangeSetting: str, today: int, customStart=None, customEnd=None) -> tuple:
+    '''First and last day of a plot range setting, None for an open end'''
+    if rangeSetting=='All time':
+        return None, None
+    elif rangeSetting=='Last 7 days':
+        return today - 7, today
+    elif rangeSetting=='Last 30 days':
+        return today - 30, today
+    elif rangeSetting=='Custom':
+        return customStart, customEnd
+    raise ValueError(f'Unknown plot range: {rangeSetting}')
+
+def binStarts(days: np.ndarray, aggregation: str) -> np.ndarray:
+    '''First Julian day of the bin holding each day, weeks start on Monday'''
+    days = np.asarray(days, dtype=np.int64)
+    if aggregation=='Daily':
+        return days
+    if aggregation=='Weekly':
+        return days - days%7
+    unit = 'M' if aggregation=='Monthly' else 'Y'
+    dates = (days - UNIX_EPOCH_JULIAN_DAY).astype('datetime64[D]')
+    return dates.astype(f'datetime64[{unit}]').astype('datetime64[D]').astype(np.int64) + UNIX_EPOCH_JULIAN_DAY
+
+def binEnd(day: int, aggregation: str) -> int:
+    '''Last Julian day of the bin holding day'''
+    if aggregation=='Daily':
+        return day
+    if aggregation=='Weekly':
+        return day - day%7 + 6
+    unit = 'M' if aggregation=='Monthly' else 'Y'
+    following = np.datetime64(day - UNIX_EPOCH_JULIAN_DAY, 'D').astype(f'datetime64[{unit}]') + 1
+    return int(following.astype('datetime64[D]').astype(np.int64)) + UNIX_EPOCH_JULIAN_DAY - 1
+
+def binCentres(binDays: np.ndarray, today: int, aggregation: str) -> np.ndarray:
+    '''Plot position of each bin as days from today'''
+    return (binDays - today).astype(float) + (AGGREGATION_DAYS[aggregation] - 1)/2
+
+def bucket(days: np.ndarray, values: np.ndarray, aggregation: str) -> tuple:
+    '''Bin start days with the sum, count and maximum of the nonzero values in each bin, days must be sorted'''
+    keep = values!=0
+    days, values = days[keep], values[keep]
+    if not len(days):
+        return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0, dtype=np.int64), np.zeros(0)
+    starts = binStarts(days, aggregation)
+    edges = np.flatnonzero(np.r_[True, starts[1:]!=starts[:-1]])
+    return starts[edges], np.add.reduceat(values, edges), np.diff(np.r_[edges, len(values)]), np.maximum.reduceat(values, edges)
+
+def valueStats(values: np.ndarray):
+    '''Statistics of plotted values in the form of rangeStats, None if there are none'''
+    values = values[values!=0]
+    if not len(values):
+        return None
+    return {
+        'count': len(values),
+        'total': float(values.sum()),
+        'mean': float(values.mean()),
+        'std': float(values.std()),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'median': float(np.median(values)),
+        }
+
+def _combine(old: np.ndarray, new: np.ndarray, overlap: str) -> np.ndarray:
+    '''Merge two columns, NaN (absent) never wins over a value'''
+    if overlap=='Sum':
+        return np.where(np.isnan(old), new, np.where(np.isnan(new), old, old + new))
+    elif overlap=='First':
+        return np.where(np.isnan(old), new, old)
+    elif overlap=='Last':
+        return np.where(np.isnan(new), old, new)
+    elif overlap=='Max':
+        return np.fmax(old, new)
+    raise ValueError(f'Unknown merge overlap rule: {overlap}')
+
+class statsIndex:
+    '''Range statistics of one column, absent and zero entries are ignored as in the plots
+
+    A segment tree holds counts, sums, sums of squares, minima and maxima, and each
+    level of a merge sort tree holds the column sorted within blocks of the node size,
+    valid values first. Any range is covered by O(log n) nodes, and the median is
+    partitioned out of the valid values of those nodes without masking the range.
+    '''
+    def __init__(self, column: np.ndarray):
+        self.height = max(int(np.ceil(np.log2(max(len(column), 1)))), 0)
+        self.size = 1 << self.height
+        leaves = np.full(self.size, np.nan)
+        leaves[:len(column)] = column
+        valid = ~np.isnan(leaves) & (leaves!=0)
+        values = np.where(valid, leaves, 0.)
+        self.count = self._build(valid.astype(float), np.add)
+        self.total = self._build(values, np.add)
+        self.squares = self._build(values**2, np.add)
+        self.low = self._build(np.where(valid, leaves, np.inf), np.minimum)
+        self.high = self._build(np.where(valid, leaves, -np.inf), np.maximum)
+        self.levels = [np.where(valid, leaves, np.inf)]
+        for level in range(1, self.height+1):
+            self.levels.append(np.sort(self.levels[0].reshape(-1, 1 << level), axis=1).ravel())
+
+    def _build(self, leaves: np.ndarray, combine) -> np.ndarray:
+        tree = np.zeros(2*self.size)
+        tree[self.size:] = leaves
+        for depth in range(self.height-1, -1, -1):
+            first = 1 << depth
+            tree[first:2*first] = combine(tree[2*first:4*first:2], tree[2*first+1:4*first:2])
+        return tree
+
+    def update(self, index: int, value: float):
+        valid = not np.isnan(value) and value!=0
+        old = self.levels[0][index]
+        new = value if valid else np.inf
+        node = index + self.size
+        self.count[node] = float(valid)
+        self.total[node] = value if valid else 0.
+        self.squares[node] = value**2 if valid else 0.
+        self.low[node] = value if valid else np.inf
+        self.high[node] = value if valid else -np.inf
+        node >>= 1
+        while node:
+            left, right = 2*node, 2*node+1
+            self.count[node] = self.count[left] + self.count[right]
+            self.total[node] = self.total[left] + self.total[right]
+            self.squares[node] = self.squares[left] + self.squares[right]
+            self.low[node] = min(self.low[left], self.low[right])
+            self.high[node] = max(self.high[left], self.high[right])
+            node >>= 1
+        self.levels[0][index] = new
+        for level in range(1, self.height+1):
+            first = (index >> level) << level
+            block = self.levels[level][first:first+(1 << level)]
+            #Shift the values between the old and new positions by one rather than sorting
+            position = int(np.searchsorted(block, old))
+            target = int(np.searchsorted(block, new))
+            if target>position:
+                block[position:target-1] = block[position+1:target]
+                block[target-1] = new
+            else:
+                block[target+1:position+1] = block[target:position]
+                block[target] = new
+
+    def _nodes(self, first: int, last: int) -> list:
+        '''Segment tree nodes exactly covering [first, last)'''
+        nodes = []
+        first += self.size
+        last += self.size
+        while first<last:
+            if first & 1:
+                nodes.append(first)
+                first += 1
+            if last & 1:
+                last -= 1
+                nodes.append(last)
+            first >>= 1
+            last >>= 1
+        return nodes
+
+    def query(self, first: int, last: int):
+        '''Statistics of entries [first, last), None if there are none'''
+        first = max(first, 0)
+        last = min(last, self.size)
+        if last<=first:
+            return None
+        nodes = self._nodes(first, last)
+        index = np.array(nodes)
+        count = int(self.count[index].sum())
+        if not count:
+            return None
+        total = float(self.total[index].sum())
+        mean = total/count
+        values = []
+        for node in nodes:
+            depth = node.bit_length() - 1
+            level = self.height - depth
+            start = (node - (1 << depth)) << level
+            values.append(self.levels[level][start:start+int(self.count[node])])
+        values = np.concatenate(values)
+        if count%2:
+            median = float(np.partition(values, count//2)[count//2])
+        else:
+            values = np.partition(values, (count//2-1, count//2))
+            median = float(values[count//2-1] + values[count//2])/2
+        return {
+            'count': count,
+            'total': total,
+            'mean': mean,
+            'std': float(np.sqrt(max(float(self.squares[index].sum())/count - mean**2, 0.))),
+            'min': float(self.low[index].min()),
+            'max': float(self.high[index].max()),
+            'median': median,
+            }
+
+class activityStore:
+    '''Columnar activity data, one float array per (activity, field) indexed by Julian day'''
+    def __init__(self):
+        self.schema = {}
+        self.start = 0
+        self.capacity = 0
+        self.dayMask = np.zeros(0, dtype=bool)
+        self.dayIndex = []
+        self.itemMasks = {}
+        self.itemSince = {}
+        self.fieldSince = {}
+        self.columns = {}
+        self.stats = {}
+        self.bins = {}
+        self.dayEntries = None
+        self.seriesCache = collections.OrderedDict()
+        self.seriesHits = 0
+        self.seriesMisses = 0
+        self.pending = []
+        self.revision = 0
+        self.savedRevision = 0
+        self.baseFile = ''
+        self.baseCrc = None
+        self.loader = None
+
+    @classmethod
+    def fromDict(cls, items: dict):
+        '''Build a store from the day->item->field layout used by the JSON files'''
+        store = cls()
+        store.loadDict(items)
+        return store
+
+    def loadDict(self, items: dict):
+        '''Add days in the day->item->field layout without recording them as edits'''
+        self.stats.clear()
+        self.bins.clear()
+        self.seriesCache.clear()
+        days = [int(key) for key in items.keys()]
+        if len(days):
+            self.reserve(min(days), max(days))
+        for key, day in zip(items.keys(), days):
+            self._addDay(day)
+            for itemKey, fields in items[key].items():
+                self._addActivity(day, itemKey)
+                for fieldKey, field in fields.items():
+                    self._addField(day, itemKey, fieldKey, float(field['value']), field['unit'])
+
+    def loadSchema(self, schema: dict, itemSince=None, fieldSince=None):
+        '''Declare activities, fields and units before any day using them is loaded, with the first day each was used'''
+        for itemKey, fields in schema.items():
+            if not itemKey in self.schema.keys():
+                self.schema[itemKey] = {}
+                self.itemMasks[itemKey] = np.zeros(self.capacity, dtype=bool)
+            if itemSince is not None and itemKey in itemSince.keys():
+                self._since(self.itemSince, itemKey, itemSince[itemKey])
+            for fieldKey, unit in fields.items():
+                if not fieldKey in self.schema[itemKey].keys():
+                    self.schema[itemKey][fieldKey] = unit
+                    self.columns[(itemKey, fieldKey)] = np.full(self.capacity, np.nan)
+                if fieldSince is not None and fieldKey in fieldSince.get(itemKey, {}).keys():
+                    self._since(self.fieldSince, (itemKey, fieldKey), fieldSince[itemKey][fieldKey])
+
+    def loadArrays(self, schema: dict, start: int, dayMask: np.ndarray, itemMasks: dict, columns: dict, itemSince: dict, fieldSince: dict):
+        '''Adopt whole columns into an empty store without copying them, e.g. memory mapped from a binary project'''
+        self.schema = schema
+        self.start = start
+        self.capacity = len(dayMask)
+        self.dayMask = dayMask
+        self.itemMasks = itemMasks
+        self.columns = columns
+        self.dayIndex = [int(day) for day in start + np.flatnonzero(dayMask)]
+        self.itemSince = dict(itemSince)
+        self.fieldSince = dict(fieldSince)
+        self.stats.clear()
+        self.bins.clear()
+        self.dayEntries = None
+        self.seriesCache.clear()
+
+    def merge(self, other, prefix: str = '', overlap: str = 'Sum'):
+        '''Combine every day of other into this store
+
+        Activities of other are renamed prefix + name, so an empty prefix merges
+        activities of the same name. A field whose unit differs from the one
+        already here becomes "field (unit)". Entries present in both are combined
+        by overlap, one of MERGE_OVERLAPS. The merge is not journalled, so the
+        next save rewrites the whole project.
+        '''
+        self.ensure()
+        other.ensure()
+        if not len(other.dayIndex):
+            return
+        self.reserve(other.dayIndex[0], other.dayIndex[-1])
+        first = other.start - self.start
+        window = slice(max(first, 0), min(first + other.capacity, self.capacity))
+        source = slice(window.start - first, window.stop - first)
+        self.dayMask[window] |= other.dayMask[source]
+        self.dayIndex = [int(day) for day in self.start + np.flatnonzero(self.dayMask)]
+        for itemKey, mask in other.itemMasks.items():
+            newKey = prefix + itemKey
+            self._bulkActivity(newKey)
+            self.itemMasks[newKey][window] |= mask[source]
+            if itemKey in other.itemSince.keys():
+                self._since(self.itemSince, newKey, other.itemSince[itemKey])
+            for fieldKey, unit in other.schema[itemKey].items():
+                newField = self._bulkField(newKey, fieldKey, unit)
+                if (itemKey, fieldKey) in other.fieldSince.keys():
+                    self._since(self.fieldSince, (newKey, newField), other.fieldSince[(itemKey, fieldKey)])
+                column = self.columns[(newKey, newField)]
+                column[window] = _combine(column[window], other.columns[(itemKey, fieldKey)][source], overlap)
+        self._bulkChanged()
+
+    def importValues(self, itemKey: str, fieldKey: str, unit: str, days: np.ndarray, values: np.ndarray, overlap: str = 'Last') -> str:
+        '''Write many values of one field at once, creating the activity and field when missing
+
+        days need not be sorted, values given twice for a day are combined by
+        overlap, as are values already stored. A unit differing from the one
+        already here makes the field "field (unit)", whose name is returned. Like
+        merge, the import is not journalled.
+        '''
+        if not len(days):
+            return fieldKey
+        days = np.asarray(days, dtype=np.int64)
+        values = np.asarray(values, dtype=float)
+        order = np.argsort(days, kind='stable')
+        days, values = days[order], values[order]
+        starts = np.flatnonzero(np.r_[True, days[1:]!=days[:-1]])
+        if overlap=='Sum':
+            values = np.add.reduceat(values, starts)
+        elif overlap=='Max':
+            values = np.maximum.reduceat(values, starts)
+        elif overlap=='First':
+            values = values[starts]
+        else:
+            values = values[np.r_[starts[1:], len(days)] - 1]
+        days = days[starts]
+        self.ensure(int(days[0]), int(days[-1]))
+        self.reserve(int(days[0]), int(days[-1]))
+        self._bulkActivity(itemKey)
+        fieldKey = self._bulkField(itemKey, fieldKey, unit)
+        index = days - self.start
+        column = self.columns[(itemKey, fieldKey)]
+        column[index] = _combine(column[index], values, overlap)
+        self.itemMasks[itemKey][index] = True
+        self._since(self.itemSince, itemKey, int(days[0]))
+        self._since(self.fieldSince, (itemKey, fieldKey), int(days[0]))
+        if not self.dayMask[index].all():
+            self.dayMask[index] = True
+            self.dayIndex = np.union1d(np.array(self.dayIndex, dtype=np.int64), days).tolist()
+        self._bulkChanged()
+        return fieldKey
+
+    def _bulkActivity(self, itemKey: str):
+        if not itemKey in self.schema.keys():
+            self.schema[itemKey] = {}
+            self.itemMasks[itemKey] = np.zeros(self.capacity, dtype=bool)
+
+    def _bulkField(self, itemKey: str, fieldKey: str, unit: str) -> str:
+        '''Name under which a field of unit is stored, added to the schema when new'''
+        if fieldKey in self.schema[itemKey].keys() and self.schema[itemKey][fieldKey]!=unit:
+            fieldKey = f'{fieldKey} ({unit})'
+        if not fieldKey in self.schema[itemKey].keys():
+            self.schema[itemKey][fieldKey] = unit
+            self.columns[(itemKey, fieldKey)] = np.full(self.capacity, np.nan)
+        return fieldKey
+
+    def _bulkChanged(self):
+        '''Drop every cache and rewrite the whole project on the next save, bulk changes are not journalled'''
+        self.stats.clear()
+        self.bins.clear()
+        self.dayEntries = None
+        self.seriesCache.clear()
+        self.baseFile = ''
+        self.revision += 1
+
+    def toDict(self, firstDay=None, lastDay=None) -> dict:
+        '''Expand the store back into the day->item->field layout, optionally limited to a day range'''
+        self.ensure(firstDay, lastDay)
+        items = {}
+        first = 0 if firstDay is None else bisect.bisect_left(self.dayIndex, firstDay)
+        last = len(self.dayIndex) if lastDay is None else bisect.bisect_right(self.dayIndex, lastDay)
+        for day in self.dayIndex[first:last]:
+            index = day - self.start
+            items[str(day)] = {}
+            for itemKey in [itemKey for itemKey, mask in self.itemMasks.items() if mask[index]]:
+                items[str(day)][itemKey] = {}
+                for fieldKey, unit in self.schema[itemKey].items():
+                    value = self.columns[(itemKey, fieldKey)][index]
+                    if not np.isnan(value):
+                        items[str(day)][itemKey][fieldKey] = {'value': float(value), 'unit': unit}
+        return items
+
+    def isModified(self) -> bool:
+        return self.revision!=self.savedRevision
+
+    def markSaved(self):
+        self.savedRevision = self.revision
+
+    def _index(self, day: int) -> int:
+        index = day - self.start
+        if 0<=index<self.capacity:
+            return index
+        return -1
+
+    def reserve(self, firstDay: int, lastDay: int):
+        '''Grow every array so that [firstDay, lastDay] can be indexed'''
+        if self.capacity==0:
+            self._resize(firstDay, max(lastDay-firstDay+1, MIN_CAPACITY))
+            return
+        end = self.start + self.capacity
+        if firstDay>=self.start and lastDay<end:
+            return
+        pad = max(self.capacity, MIN_CAPACITY)
+        newStart = self.start if firstDay>=self.start else min(firstDay, self.start-pad)
+        newEnd = end if lastDay<end else max(lastDay+1, end+pad)
+        self._resize(newStart, newEnd-newStart)
+
+    def _resize(self, newStart: int, newCapacity: int):
+        offset = self.start - newStart
+        def grow(array, fill):
+            newArray = np.full(newCapacity, fill, dtype=array.dtype)
+            newArray[offset:offset+self.capacity] = array
+            return newArray
+        self.dayMask = grow(self.dayMask, False)
+        self.itemMasks = {key: grow(mask, False) for key, mask in self.itemMasks.items()}
+        self.columns = {key: grow(column, np.nan) for key, column in self.columns.items()}
+        if self.dayEntries is not None:
+            self.dayEntries = grow(self.dayEntries, 0)
+        self.start = newStart
+        self.capacity = newCapacity
+        self.stats.clear()
+
+    def ensure(self, firstDay=None, lastDay=None):
+        '''Have the loader of a partially loaded project read the days in [firstDay, lastDay] now'''
+        loader = self.loader #Cleared by whichever thread reads the last partition
+        if loader is not None:
+            loader.ensure(self, firstDay, lastDay)
+
+    def days(self) -> np.ndarray:
+        '''Sorted Julian days which have entries'''
+        self.ensure()
+        return np.array(self.dayIndex, dtype=int)
+
+    def hasDay(self, day: int) -> bool:
+        self.ensure(day, day)
+        index = self._index(day)
+        return index>=0 and bool(self.dayMask[index])
+
+    def mostRecentDay(self, onOrBefore: int):
+        '''Latest populated day not after onOrBefore, or None'''
+        day = self._mostRecentLoaded(onOrBefore)
+        loader = self.loader
+        if loader is not None:
+            for firstDay, lastDay in loader.unloadedRanges():
+                if firstDay>onOrBefore:
+                    continue
+                if day is not None and lastDay<=day:
+                    break
+                self.ensure(firstDay, lastDay)
+                day = self._mostRecentLoaded(onOrBefore)
+        return day
+
+    def _mostRecentLoaded(self, onOrBefore: int):
+        position = bisect.bisect_right(self.dayIndex, onOrBefore)
+        return self.dayIndex[position-1] if position else None
+
+    def schemaDay(self, day: int, today: int) -> int:
+        '''Day whose activities and fields are shown on day: day itself once it has entries,
+        otherwise the previous populated day, or the most recent one up to today when there is none'''
+        if self.hasDay(day):
+            return day
+        template = self.mostRecentDay(min(day, today))
+        if template is None:
+            template = self.mostRecentDay(today)
+        return day if template is None else template
+
+    def activities(self, day: int) -> list:
+        '''Activities used on or before day, days inherit every activity seen before them'''
+        return [itemKey for itemKey in self.schema.keys() if self.itemSince.get(itemKey, day+1)<=day]
+
+    def fields(self, day: int, itemKey: str) -> list:
+        '''Fields of an activity used on or before day'''
+        if not itemKey in self.schema.keys():
+            return []
+        return [fieldKey for fieldKey in self.schema[itemKey].keys() if self.fieldSince.get((itemKey, fieldKey), day+1)<=day]
+
+    def unit(self, itemKey: str, fieldKey: str) -> str:
+        return self.schema[itemKey][fieldKey]
+
+    def value(self, day: int, itemKey: str, fieldKey: str) -> float:
+        '''Value entered on day, zero for a field that was not entered'''
+        self.ensure(day, day)
+        index = self._index(day)
+        if index<0:
+            return 0.
+        value = self.columns[(itemKey, fieldKey)][index]
+        return 0. if np.isnan(value) else float(value)
+
+    def _since(self, since: dict, key, day: int):
+        if not key in since.keys() or day<since[key]:
+            since[key] = day
+
+    def _addDay(self, day: int):
+        self.reserve(day, day)
+        if not self.dayMask[day-self.start]:
+            self.dayMask[day-self.start] = True
+            bisect.insort(self.dayIndex, day)
+
+    def _addActivity(self, day: int, itemKey: str):
+        self._addDay(day)
+        if not itemKey in self.schema.keys():
+            self.schema[itemKey] = {}
+            self.itemMasks[itemKey] = np.zeros(self.capacity, dtype=bool)
+        self.itemMasks[itemKey][day-self.start] = True
+        self._since(self.itemSince, itemKey, day)
+
+    def _addField(self, day: int, itemKey: str, fieldKey: str, value: float, unit: str):
+        self._addActivity(day, itemKey)
+        if not fieldKey in self.schema[itemKey].keys():
+            self.schema[itemKey][fieldKey] = unit
+            self.columns[(itemKey, fieldKey)] = np.full(self.capacity, np.nan)
+        self._since(self.fieldSince, (itemKey, fieldKey), day)
+        self._setValue(day, itemKey, fieldKey, value)
+
+    def _setValue(self, day: int, itemKey: str, fieldKey: str, value: float):
+        column = self.columns[(itemKey, fieldKey)]
+        if self.dayEntries is not None:
+            self.dayEntries[day-self.start] += int(not np.isnan(value)) - int(not np.isnan(column[day-self.start]))
+        column[day-self.start] = value
+        if (itemKey, fieldKey) in self.stats.keys():
+            self.stats[(itemKey, fieldKey)].update(day-self.start, value)
+        for key in [key for key in self.bins.keys() if key[:2]==(itemKey, fieldKey)]:
+            del self.bins[key]
+        self._dropSeries(day, (itemKey, fieldKey))
+
+    def _record(self, record: dict):
+        self.pending.append(record)
+        self.revision += 1
+
+    def addDay(self, day: int):
+        self.ensure(day, day)
+        self._addDay(day)
+        self._record({'op': 'day', 'day': day})
+
+    def addActivity(self, day: int, itemKey: str):
+        self.ensure(day, day)
+        self._addActivity(day, itemKey)
+        self._record({'op': 'activity', 'day': day, 'item': itemKey})
+
+    def addField(self, day: int, itemKey: str, fieldKey: str, value: float, unit: str):
+        '''Add a field to an activity on one day, the unit is only recorded the first time the field is seen'''
+        self.ensure(day, day)
+        self._addField(day, itemKey, fieldKey, value, unit)
+        self._record({'op': 'field', 'day': day, 'item': itemKey, 'field': fieldKey, 'value': value, 'unit': unit})
+
+    def setValue(self, day: int, itemKey: str, fieldKey: str, value: float):
+        '''Enter a value, only stored when it differs from what the day shows so untouched fields stay empty'''
+        if self.value(day, itemKey, fieldKey)==value:
+            return
+        if self._index(day)<0 or np.isnan(self.columns[(itemKey, fieldKey)][day-self.start]):
+            self.addField(day, itemKey, fieldKey, value, self.unit(itemKey, fieldKey))
+            return
+        self._setValue(day, itemKey, fieldKey, value)
+        self._record({'op': 'value', 'day': day, 'item': itemKey, 'field': fieldKey, 'value': value})
+
+    def applyRecord(self, record: dict):
+        '''Replay one edit record produced by the public mutation methods'''
+        self.ensure(record['day'], record['day'])
+        op = record['op']
+        if op=='day':
+            self._addDay(record['day'])
+        elif op=='activity':
+            self._addActivity(record['day'], record['item'])
+        elif op=='field':
+            self._addField(record['day'], record['item'], record['field'], record['value'], record['unit'])
+        elif op=='value':
+            self._setValue(record['day'], record['item'], record['field'], record['value'])
+        else:
+            raise ValueError(f'Unknown journal record: {op}')
+
+    def series(self, itemKey: str, fieldKey: str, startDay=None, endDay=None, positive: bool = False):
+        '''Days and values of one field between startDay and endDay inclusive, None for an open end,
+        only the values above zero (as drawn by Line and Scatter plots) with positive
+
+        The arrays are read only, recently used series are kept until a value in their range changes.
+        '''
+        key = (itemKey, fieldKey, startDay, endDay)
+        if key in self.seriesCache.keys():
+            self.seriesHits += 1
+            self.seriesCache.move_to_end(key)
+        else:
+            self.seriesMisses += 1
+            self.seriesCache[key] = self._series(itemKey, fieldKey, startDay, endDay) + [None]
+            if len(self.seriesCache)>SERIES_CACHE_SIZE:
+                self.seriesCache.popitem(last=False)
+        entry = self.seriesCache[key]
+        days, values, mask = entry
+        if not positive:
+            return days, values
+        if mask is None:
+            mask = entry[2] = values>0
+        return days[mask], values[mask]
+
+    def _series(self, itemKey: str, fieldKey: str, startDay, endDay) -> list:
+        self.ensure(startDay, endDay)
+        column = self.columns.get((itemKey, fieldKey))
+        first = 0 if startDay is None else max(startDay-self.start, 0)
+        last = self.capacity if endDay is None else min(endDay-self.start+1, self.capacity)
+        if column is None or last<=first:
+            days, values = np.zeros(0, dtype=int), np.zeros(0)
+        else:
+            values = column[first:last]
+            present = np.flatnonzero(~np.isnan(values))
+            days, values = self.start + first + present, values[present]
+        days.flags.writeable = False
+        values.flags.writeable = False
+        return [days, values]
+
+    def _dropSeries(self, day: int, key=None):
+        '''Forget cached series covering day, of one (activity, field) or of all'''
+        for cacheKey in list(self.seriesCache.keys()):
+            itemKey, fieldKey, startDay, endDay = cacheKey
+            if (key is None or key==(itemKey, fieldKey)) and (startDay is None or startDay<=day) and (endDay is None or day<=endDay):
+                del self.seriesCache[cacheKey]
+
+    def seriesCacheInfo(self) -> dict:
+        return {'hits': self.seriesHits, 'misses': self.seriesMisses, 'size': len(self.seriesCache)}
+
+    def rangeStats(self, itemKey: str, fieldKey: str, startDay=None, endDay=None):
+        '''Count, total, mean, std, min, max and median of the nonzero values between startDay and endDay inclusive'''
+        self.ensure(startDay, endDay)
+        if not (itemKey, fieldKey) in self.columns.keys():
+            return None
+        if not (itemKey, fieldKey) in self.stats.keys():
+            self.stats[(itemKey, fieldKey)] = statsIndex(self.columns[(itemKey, fieldKey)])
+        first = 0 if startDay is None else startDay-self.start
+        last = self.capacity if endDay is None else endDay-self.start+1
+        return self.stats[(itemKey, fieldKey)].query(first, last)
+
+    def _dayEntries(self) -> np.ndarray:
+        '''Number of values entered on each day, counted once and then kept up to date by _setValue'''
+        if self.dayEntries is None:
+            self.dayEntries = np.zeros(self.capacity, dtype=np.int32)
+            for column in self.columns.values():
+                self.dayEntries += ~np.isnan(column)
+        return self.dayEntries
+
+    def daySummary(self, firstDay: int, lastDay: int) -> tuple:
+        '''Whether each day of [firstDay, lastDay] has entries, and how many values were entered on it'''
+        self.ensure(firstDay, lastDay)
+        present = np.zeros(lastDay-firstDay+1, dtype=bool)
+        entries = np.zeros(lastDay-firstDay+1, dtype=np.int32)
+        first = firstDay - self.start
+        low = min(max(first, 0), self.capacity)
+        window = slice(low, max(min(first + len(present), self.capacity), low))
+        target = slice(window.start - first, window.stop - first)
+        present[target] = self.dayMask[window]
+        entries[target] = self._dayEntries()[window]
+        return present, entries
+
+    def mostEntries(self) -> int:
+        '''Largest number of values entered on one day among the loaded days'''
+        return int(self._dayEntries().max(initial=0))
+
+    def _bins(self, itemKey: str, fieldKey: str, aggregation: str) -> tuple:
+        '''Cached bucket() of the whole column, dropped whenever a value of the field changes'''
+        key = (itemKey, fieldKey, aggregation)
+        if not key in self.bins.keys():
+            self.bins[key] = bucket(*self.series(itemKey, fieldKey), aggregation)
+        return self.bins[key]
+
+    def aggregate(self, itemKey: str, fieldKey: str, aggregation: str, function: str, startDay=None, endDay=None):
+        '''Bin start days and the sum, mean or max of the nonzero values in each bin between startDay and endDay inclusive
+
+        Bins lying wholly inside the range come from the cache, the bins cut by
+        the ends of the range are bucketed again from the days inside it.
+        '''
+        if aggregation=='Daily':
+            plotDays, values = self.series(itemKey, fieldKey, startDay, endDay)
+            return plotDays, values
+        self.ensure(startDay, endDay)
+        binDays, sums, counts, maxima = self._bins(itemKey, fieldKey, aggregation)
+        inside = np.ones(len(binDays), dtype=bool)
+        low, high = [], []
+        first = None if startDay is None else int(binStarts([startDay], aggregation)[0])
+        last = None if endDay is None else int(binStarts([endDay], aggregation)[0])
+        if first is not None:
+            inside &= binDays>first
+            lowEnd = binEnd(first, aggregation) if endDay is None else min(binEnd(first, aggregation), endDay)
+            low.append(bucket(*self.series(itemKey, fieldKey, startDay, lowEnd), aggregation))
+        if last is not None:
+            inside &= binDays<last
+            if first is None or last>first:
+                high.append(bucket(*self.series(itemKey, fieldKey, last, endDay), aggregation))
+        parts = low + [(binDays[inside], sums[inside], counts[inside], maxima[inside])] + high
+        binDays, sums, counts, maxima = [np.concatenate(arrays) for arrays in zip(*parts)]
+        if function=='Sum':
+            return binDays, sums
+        elif function=='Mean':
+            return binDays, sums/counts
+        elif function=='Max':
+            return binDays, maxima
+        raise ValueError(f'Unknown aggregate function: {function}')
@@ -16,20 +16,38 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 import sys
-import json
+
+#Headless commands must not import Qt or matplotlib. Spawned worker processes
+#re-import __main__, so it becomes the command line module rather than this one
+if (__name__=='__main__') and len(sys.argv)>1:
+    import activitycli
+    sys.modules['__main__'] = activitycli
+    sys.exit(activitycli.main(sys.argv[1:]))
+
 import os
 import datetime
-import copy
+import functools
 import numpy as np
-from PyQt5.QtCore import Qt, QDate
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QLineEdit, QPushButton, QHBoxLayout, QListWidget, QVBoxLayout, QLabel, QGridLayout, QScrollArea, QComboBox, QFileDialog, QDialog, QCalendarWidget
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-import matplotlib.pyplot as plt
+from PyQt5.QtCore import Qt, QDate, QTimer, QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QFontDatabase, QColor, QTextCharFormat
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QLineEdit, QPushButton, QHBoxLayout, QListView, QTableView, QHeaderView, QAbstractItemView, QVBoxLayout, QLabel, QComboBox, QCheckBox, QFileDialog, QDialog, QCalendarWidget, QProgressBar
+from activitystore import activityStore, rangeDays, valueStats, binCentres, PLOT_RANGES, PLOT_TYPES, AGGREGATIONS, AGGREGATE_FUNCTIONS, AGGREGATION_DAYS, MERGE_OVERLAPS
+from activityio import loadFile, loadFiles, saveFile, importCsv, checkPartitionedTarget, MANIFEST_NAME
+from activitymodels import activityListModel, fieldTableModel, valueDelegate
+import activityprofile
+from activityprofile import timed
 
-def getVersion():
-    with open('helptext.txt','r') as f:
+#Help text is read from next to this script rather than the working directory
+HELP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),'helptext.txt')
+
+@functools.lru_cache(maxsize=None)
+def getHelpText() -> tuple:
+    with open(HELP_FILE,'r') as f:
         lines = f.readlines()
-    for line in lines:
+    return tuple(lines)
+
+def getVersion():
+    for line in getHelpText():
         if 'Version - ' in line:
             return line.split('Version - ')[-1].strip('\n')
 VERSION_STRING = getVersion()
@@ -40,32 +58,95 @@ ITEMS_WIDTH = 300
 FIELDS_WIDTH = 300
 PLOT_WIDTH = 650
 
+#The plotting library is loaded this long after the window is first shown
+PLOT_WARMUP_MS = 200
+
+#Set ACTIVITYTRACKER_PLOT_BACKEND=pyqtgraph to plot with pyqtgraph instead of matplotlib
+PLOT_BACKEND = os.environ.get('ACTIVITYTRACKER_PLOT_BACKEND','matplotlib')
+
+#The progress bar only appears for operations which take longer than this
+PROGRESS_DELAY_MS = 300
+
+#The timings window is refreshed this often
+TIMINGS_REFRESH_MS = 500
+
+#Calendar days are shaded by the number of values entered, lightest first
+HEAT_COLOURS = ['#e5f5e0', '#c7e9c0', '#a1d99b', '#74c476']
+
+#Days shaded around a month, enough to cover the six weeks a calendar shows
+CALENDAR_MARGIN = 7
+CALENDAR_DAYS = 49
+
 #Set default directory
 defaultDirectory = f'{os.path.expanduser("~")}/Documents/'
 
-#File IO function
-def loadFile(fileName: str) -> dict:
-    with open(fileName,'r') as f:
-        items = json.loads(f.read())
-    return items
+@timed
+def plotData(items: activityStore, itemKey: str, fieldKey: str, startDay, endDay, aggregation: str = 'Daily', function: str = 'Sum', positive: bool = False):
+    '''Series and statistics of one field, of the bins when aggregated, None if it has no nonzero entries in the range'''
+    if aggregation=='Daily':
+        stats = items.rangeStats(itemKey,fieldKey,startDay,endDay)
+        if stats is None:
+            return None
+        plotDays, plotY = items.series(itemKey,fieldKey,startDay,endDay,positive)
+        return plotDays, plotY, stats
+    plotDays, plotY = items.aggregate(itemKey,fieldKey,aggregation,function,startDay,endDay)
+    stats = valueStats(plotY)
+    if stats is None:
+        return None
+    return plotDays, plotY, stats
 
-def saveFile(fileName: str, items: dict):
-    with open(fileName,'w') as f:
-        f.write(json.dumps(items))
+#Worker classes
+class workerSignals(QObject):
+    '''Results of a worker, delivered to slots on the main thread'''
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    progress = pyqtSignal(int)
 
-def itemField(label: str, value: float, unit: str) -> dict:
-    return {label: {'value': value, 'unit': unit}}
+class worker(QRunnable):
+    '''Runs one slow operation (open, save, plot, export) on the thread pool,
+    ensure is (items, firstDay, lastDay) when partitions must be read before it'''
+    def __init__(self, function, args: tuple, withProgress: bool, ensure=None):
+        super().__init__()
+        self.function = function
+        self.args = args
+        self.withProgress = withProgress
+        self.ensure = ensure
+        self.signals = workerSignals()
+    
+    def run(self):
+        try:
+            if self.ensure is not None:
+                items, firstDay, lastDay = self.ensure
+                items.ensure(firstDay,lastDay)
+            if self.withProgress:
+                result = self.function(*self.args,progress=lambda fraction: self.signals.progress.emit(int(100*fraction)))
+            else:
+                result = self.function(*self.args)
+        except Exception as error:
+            self.signals.failed.emit(str(error))
+        else:
+            self.signals.finished.emit(result)
 
 #GUI classes
 class mainWindow(QMainWindow):
     '''Main window'''
     def __init__(self):
         super().__init__()
-        self.items = {}
-        self.itemsLoad = {}
+        self.items = activityStore()
+        self.heatFormats = []
+        for colour in HEAT_COLOURS:
+            textFormat = QTextCharFormat()
+            textFormat.setBackground(QColor(colour))
+            self.heatFormats.append(textFormat)
+        self.jobs = set()
+        self.closeRequested = False
+        self.lastPlot = None
         self.currentDirectory = defaultDirectory
         self.currentFile = ''
         self._setTitle()
+        self.progressBar = QProgressBar()
+        self.progressBar.setVisible(False)
+        self.statusBar().addPermanentWidget(self.progressBar)
         self.generalLayout = QHBoxLayout()
         centralWidget = QWidget(self)
         centralWidget.setLayout(self.generalLayout)
@@ -79,20 +160,31 @@ class mainWindow(QMainWindow):
     
     def _createMenu(self):
         menu = self.menuBar().addMenu('&Menu')
-        menu.addAction('&New', self._new, shortcut='Ctrl+N')
-        menu.addAction('&Open', self._open, shortcut='Ctrl+O')
-        menu.addAction('&Save', self._save, shortcut='Ctrl+S')
-        menu.addAction('&Save As', self._saveAs,shortcut='Ctrl+Shift+S')
+        self.fileActions = [
+            menu.addAction('&New', self._new, shortcut='Ctrl+N'),
+            menu.addAction('&Open', self._open, shortcut='Ctrl+O'),
+            menu.addAction('Open Se&veral', self._openSeveral),
+            menu.addAction('&Attach', self._attach),
+            menu.addAction('&Import CSV', self._importCsv),
+            menu.addAction('&Save', self._save, shortcut='Ctrl+S'),
+            menu.addAction('&Save As', self._saveAs,shortcut='Ctrl+Shift+S'),
+            menu.addAction('Save As &Partitioned', self._saveAsPartitioned),
+            menu.addAction('&Export All Plots', self._exportAllPlots),
+            ]
         menu.addAction('&Exit', self.close, shortcut='Alt+F4')
         helpMenu = self.menuBar().addMenu('&Help')
         helpMenu.addAction('&Information', self._helpPopUp, shortcut='Ctrl+H')
+        if activityprofile.ENABLED:
+            helpMenu.addAction('&Timings', self._timingsPopUp)
     
     def _createItemsBox(self):
         itemsLayout = QVBoxLayout()
         self.cal0 = QCalendarWidget()
         itemsLayout.addWidget(self.cal0)
-        self.currentDay = str(self.cal0.selectedDate().toJulianDay())
-        self.itemsBox = QListWidget()
+        self.currentDay = self.cal0.selectedDate().toJulianDay()
+        self.itemModel = activityListModel()
+        self.itemsBox = QListView()
+        self.itemsBox.setModel(self.itemModel)
         self.itemsBox.setFixedHeight(ITEMS_HEIGHT)
         self.itemsBox.setFixedWidth(ITEMS_WIDTH)
         itemsLayout.addWidget(self.itemsBox)
@@ -115,11 +207,17 @@ class mainWindow(QMainWindow):
         fieldsLayout.addWidget(self.medianVal)
         fieldsLayout.addWidget(self.stdVal)
         fieldsLayout.addWidget(self.totVal)
-        self.fieldFormScroll = QScrollArea(self)
-        self.fieldFormScroll.setFixedHeight(ITEMS_HEIGHT)
-        self.fieldFormScroll.setFixedWidth(FIELDS_WIDTH)
-        self.fieldFormScroll.setAlignment(Qt.AlignmentFlag.AlignLeft)
-        fieldsLayout.addWidget(self.fieldFormScroll)
+        self.fieldModel = fieldTableModel()
+        self.fieldTable = QTableView(self)
+        self.fieldTable.setModel(self.fieldModel)
+        self.fieldDelegate = valueDelegate(self.fieldTable)
+        self.fieldTable.setItemDelegateForColumn(fieldTableModel.VALUE_COLUMN,self.fieldDelegate)
+        self.fieldTable.setEditTriggers(QAbstractItemView.AllEditTriggers)
+        self.fieldTable.verticalHeader().setVisible(False)
+        self.fieldTable.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.fieldTable.setFixedHeight(ITEMS_HEIGHT)
+        self.fieldTable.setFixedWidth(FIELDS_WIDTH)
+        fieldsLayout.addWidget(self.fieldTable)
         fieldButtons = QHBoxLayout()
         self.fieldButton = QPushButton('Add field')
         fieldButtons.addWidget(self.fieldButton)
@@ -128,7 +226,6 @@ class mainWindow(QMainWindow):
         fieldsLayout.addLayout(fieldButtons)
         fieldsLayout.setAlignment(Qt.AlignmentFlag.AlignBottom)
         self.generalLayout.addLayout(fieldsLayout)
-        self.editBoxes = {}
     
     def _createPlotBox(self):
         plotLayout = QVBoxLayout()
@@ -138,22 +235,31 @@ class mainWindow(QMainWindow):
         calLayout.addWidget(self.cal1)
         calLayout.addWidget(self.cal2)
         plotLayout.addLayout(calLayout)
-        self.figure = plt.figure()
-        self.plotWidget = FigureCanvas(self.figure)
+        self.renderer = None
+        self.plotWidget = QWidget()
         self.plotWidget.setFixedHeight(ITEMS_HEIGHT)
         self.plotWidget.setFixedWidth(PLOT_WIDTH)
         plotControlWidget = QHBoxLayout()
         plotControlWidget.addWidget(QLabel('Plot Range:'))
         self.plotRange = QComboBox()
         plotControlWidget.addWidget(self.plotRange)
-        self.plotRange.addItems(['Last 7 days', 'Last 30 days', 'All time', 'Custom'])
+        self.plotRange.addItems(PLOT_RANGES)
+        self.plotAggregation = QComboBox()
+        plotControlWidget.addWidget(self.plotAggregation)
+        self.plotAggregation.addItems(AGGREGATIONS)
+        self.plotFunction = QComboBox()
+        plotControlWidget.addWidget(self.plotFunction)
+        self.plotFunction.addItems(AGGREGATE_FUNCTIONS)
+        self.plotFunction.setEnabled(False)
+        self.plotAggregation.currentTextChanged.connect(lambda aggregation: self.plotFunction.setEnabled(aggregation!='Daily'))
         plotControlWidget.addWidget(QLabel('Field:'))
         self.plotField = QComboBox()
+        self.plotField.setModel(self.fieldModel) #Follows the field table without being refilled
         plotControlWidget.addWidget(self.plotField)
         plotControlWidget.addWidget(QLabel('Plot type:'))
         self.plotType = QComboBox()
         plotControlWidget.addWidget(self.plotType)
-        self.plotType.addItems(['Bar','Line','Scatter'])
+        self.plotType.addItems(PLOT_TYPES)
         self.plotButton = QPushButton('Plot')
         plotControlWidget.addWidget(self.plotButton)
         self.savePlotButton = QPushButton('Save Plot')
@@ -162,84 +268,138 @@ class mainWindow(QMainWindow):
         plotLayout.addLayout(plotControlWidget)
         plotLayout.setAlignment(Qt.AlignmentFlag.AlignBottom)
         self.generalLayout.addLayout(plotLayout)
+        self.plotLayout = plotLayout
+    
+    def _createPlotCanvas(self):
+        '''Load the plotting library and replace the placeholder with the plot canvas'''
+        if self.renderer is not None:
+            return
+        if PLOT_BACKEND=='pyqtgraph':
+            from activitygraph import pyqtgraphRenderer
+            self.renderer = pyqtgraphRenderer()
+            plotCanvas = self.renderer.widget
+        else:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+            from activityplot import figureRenderer
+            figure = Figure()
+            plotCanvas = FigureCanvas(figure)
+            self.renderer = figureRenderer(figure)
+        plotCanvas.setFixedHeight(ITEMS_HEIGHT)
+        plotCanvas.setFixedWidth(PLOT_WIDTH)
+        self.plotLayout.replaceWidget(self.plotWidget,plotCanvas)
+        self.plotWidget.deleteLater()
+        self.plotWidget = plotCanvas
     
+    @timed
     def _displayItems(self):
-        self.itemsBox.clear()
-        for key in self.items[self.currentDay].keys():
-            self.itemsBox.addItem(key)
-        self.itemsBox.setCurrentRow(0)
+        self.itemModel.setActivities(self.items.activities(self._schemaDay()))
+        if not self.itemsBox.currentIndex().isValid() and self.itemModel.rowCount():
+            self.itemsBox.setCurrentIndex(self.itemModel.index(0))
     
+    @timed
     def _displayFields(self):
-        fieldFormScrollContents = QWidget()
-        self.fieldForm = QGridLayout(fieldFormScrollContents)
-        currentItem = self.itemsBox.currentItem()
-        if currentItem is not None:
-            self.editBoxes = {key: QLineEdit() for key in self.items[self.currentDay][currentItem.text()].keys()}
-            for row, key in enumerate(self.items[self.currentDay][currentItem.text()].keys()):
-                self.editBoxes[key].setText(str(self.items[self.currentDay][currentItem.text()][key]['value']))
-                self.fieldForm.addWidget(QLabel(key),row,0)
-                self.fieldForm.addWidget(self.editBoxes[key],row,1)
-                self.fieldForm.addWidget(QLabel(self.items[self.currentDay][currentItem.text()][key]['unit']),row,2)
-        self.fieldFormScroll.setWidget(fieldFormScrollContents)
-        self.plotField.clear()
-        self.plotField.addItems(list(self.editBoxes.keys()))
+        itemKey = self._currentActivity()
+        fieldKeys = [] if itemKey is None else self.items.fields(self._schemaDay(),itemKey)
+        self.fieldModel.setFields(self.items,self.currentDay,itemKey,fieldKeys)
+        if self.plotField.currentIndex()<0 and len(fieldKeys):
+            self.plotField.setCurrentIndex(0)
     
+    def _shadeCalendars(self):
+        for calendar in [self.cal0, self.cal1, self.cal2]:
+            self._shadeCalendar(calendar,calendar.yearShown(),calendar.monthShown())
+    
+    @timed
+    def _shadeCalendar(self, calendar: QCalendarWidget, year: int, month: int):
+        '''Shade the days of the shown month by how many values were entered, as a fraction of the busiest day'''
+        if len(self.jobs): #A worker may be changing the project, shaded again once it is done
+            return
+        firstDay = QDate(year,month,1).toJulianDay() - CALENDAR_MARGIN
+        present, entries = self.items.daySummary(firstDay,firstDay+CALENDAR_DAYS-1)
+        levels = np.where(present,np.maximum(np.ceil(len(HEAT_COLOURS)*entries/max(self.items.mostEntries(),1)),1),0).astype(int)
+        calendar.setDateTextFormat(QDate(),QTextCharFormat()) #Clears the shading of the previous month
+        for offset in np.flatnonzero(levels).tolist():
+            calendar.setDateTextFormat(QDate.fromJulianDay(firstDay+offset),self.heatFormats[levels[offset]-1])
+    
+    def _currentActivity(self):
+        '''Name of the selected activity, None when there is none'''
+        index = self.itemsBox.currentIndex()
+        return self.itemModel.data(index) if index.isValid() else None
+    
+    @timed
     def _generatePlot(self):
-        self.figure.clear()
+        self._createPlotCanvas()
         rangeSetting = self.plotRange.currentText()
         plotMode = self.plotType.currentText()
-        if rangeSetting=='All time':
-            plotRangeKeys = sorted(list(self.items.keys()))
-        else:
-            endDay = QDate.currentDate().toJulianDay()
-            if rangeSetting=='Last 7 days':
-                startDay = endDay - 7
-            elif rangeSetting=='Last 30 days':
-                startDay = endDay - 30
-            elif rangeSetting=='Custom':
-                startDay = self.cal1.selectedDate().toJulianDay()
-                endDay = self.cal2.selectedDate().toJulianDay()
-            plotRangeKeys = [str(x) for x in range(startDay,endDay+1)]
-        plotX = []
-        plotY = []
-        for key in plotRangeKeys:
-            try:
-                plotY.append(float(self.items[key][self.itemsBox.currentItem().text()][self.plotField.currentText()]['value']))
-                plotX.append(float(key)-float(QDate.currentDate().toJulianDay()))
-            except (KeyError,AttributeError):
-                pass
-        plotX = np.array(plotX)
-        plotY = np.array(plotY)
-        ax = self.figure.add_subplot(111)
-        if (plotMode=='Bar'):
-            ax.bar(plotX,plotY)
-        elif (plotMode=='Line'):
-            ax.plot(plotX[plotY>0],plotY[plotY>0],marker='o')
-        elif (plotMode=='Scatter'):
-            ax.scatter(plotX[plotY>0],plotY[plotY>0])
-        ax.set_xlabel('Day')
-        try:
-            ax.set_ylabel(f'{self.plotField.currentText()} ({self.items[self.currentDay][self.itemsBox.currentItem().text()][self.plotField.currentText()]["unit"]})')
-        except AttributeError:
-            self.figure.clear()
-        self.plotWidget.draw()
-        plotY = np.array([x for x in plotY if not x==0])
-        if len(plotY):
-            self.meanVal.setText(f'Mean: {np.mean(plotY):.1f} {self.items[self.currentDay][self.itemsBox.currentItem().text()][self.plotField.currentText()]["unit"]}')
-            self.maxVal.setText(f'Max: {max(plotY):.1f} {self.items[self.currentDay][self.itemsBox.currentItem().text()][self.plotField.currentText()]["unit"]}')
-            self.minVal.setText(f'Min: {min(plotY):.1f} {self.items[self.currentDay][self.itemsBox.currentItem().text()][self.plotField.currentText()]["unit"]}')
-            self.medianVal.setText(f'Median: {np.median(plotY):.1f} {self.items[self.currentDay][self.itemsBox.currentItem().text()][self.plotField.currentText()]["unit"]}')
-            self.stdVal.setText(f'Standard deviation: {np.std(plotY):.1f} {self.items[self.currentDay][self.itemsBox.currentItem().text()][self.plotField.currentText()]["unit"]}')
-            self.totVal.setText(f'Total: {np.sum(plotY):.1f} {self.items[self.currentDay][self.itemsBox.currentItem().text()][self.plotField.currentText()]["unit"]}')
+        aggregation = self.plotAggregation.currentText()
+        function = self.plotFunction.currentText()
+        today = QDate.currentDate().toJulianDay()
+        startDay, endDay = rangeDays(rangeSetting,today,self.cal1.selectedDate().toJulianDay(),self.cal2.selectedDate().toJulianDay())
+        itemKey = self._currentActivity()
+        fieldKey = self.plotField.currentText()
+        if itemKey is None:
+            self.renderer.clear()
+            self.lastPlot = None
+            return
+        plotSettings = (itemKey,fieldKey,startDay,endDay,plotMode,today,aggregation,function)
+        self._startJob(plotData,(self.items,itemKey,fieldKey,startDay,endDay,aggregation,function,plotMode!='Bar'),functools.partial(self._showPlot,plotSettings),ensure=self._plotDays(startDay,endDay,aggregation))
+    
+    def _plotDays(self, startDay, endDay, aggregation: str) -> tuple:
+        '''Days a plot reads, the cached bins of an aggregate span every day'''
+        return (self.items,startDay,endDay) if aggregation=='Daily' else (self.items,None,None)
+    
+    @timed
+    def _showPlot(self, plotSettings: tuple, result):
+        itemKey, fieldKey, startDay, endDay, plotMode, today, aggregation, function = plotSettings
+        if result is not None:
+            plotDays, plotY, stats = result
+            unit = self.items.unit(itemKey,fieldKey)
+            self.renderer.update(binCentres(plotDays,today,aggregation),plotY,plotMode,f'{fieldKey} ({unit})',AGGREGATION_DAYS[aggregation])
+            self.lastPlot = plotSettings
+            self.meanVal.setText(f'Mean: {stats["mean"]:.1f} {unit}')
+            self.maxVal.setText(f'Max: {stats["max"]:.1f} {unit}')
+            self.minVal.setText(f'Min: {stats["min"]:.1f} {unit}')
+            self.medianVal.setText(f'Median: {stats["median"]:.1f} {unit}')
+            self.stdVal.setText(f'Standard deviation: {stats["std"]:.1f} {unit}')
+            self.totVal.setText(f'Total: {stats["total"]:.1f} {unit}')
         else:
-            self.figure.clear()
-            self.plotWidget.draw()
+            self.renderer.clear()
+            self.lastPlot = None
     
+    @timed
     def _exportPlot(self):
         imName = QFileDialog.getSaveFileName(self,'',self.currentDirectory)[0]
+        if imName=='':
+            return
         if imName[-4:]!='.png':
             imName+='.png'
-        plt.savefig(imName)
+        self._createPlotCanvas()
+        if PLOT_BACKEND=='pyqtgraph' or self.lastPlot is None:
+            self.renderer.export(imName)
+        else:
+            from activityplot import renderPlot
+            itemKey, fieldKey, startDay, endDay, plotMode, today, aggregation, function = self.lastPlot
+            self._startJob(renderPlot,(self.items,itemKey,fieldKey,startDay,endDay,plotMode,today,imName,aggregation,function),lambda result: None,message=f'Saving {imName}')
+    
+    def _exportAllPlots(self):
+        dirName = QFileDialog.getExistingDirectory(self,'',self.currentDirectory)
+        if dirName=='':
+            return
+        self.eDialogue = exportDialogue(self,dirName)
+        self.eDialogue.setWindowTitle('Export All Plots')
+        self.eDialogue.setWindowModality(Qt.ApplicationModal)
+        self.eDialogue.show()
+    
+    def _startExportAll(self, dirName: str, pdf: bool):
+        '''Save every field with the current plot settings, rendered on a process pool'''
+        from activityplot import exportPlots
+        today = QDate.currentDate().toJulianDay()
+        startDay, endDay = rangeDays(self.plotRange.currentText(),today,self.cal1.selectedDate().toJulianDay(),self.cal2.selectedDate().toJulianDay())
+        aggregation = self.plotAggregation.currentText()
+        pairs = [(itemKey, fieldKey) for itemKey, fields in self.items.schema.items() for fieldKey in fields.keys()]
+        pdfName = os.path.join(dirName,'plots.pdf') if pdf else None
+        args = (self.items,pairs,startDay,endDay,self.plotType.currentText(),today,dirName,aggregation,self.plotFunction.currentText(),pdfName)
+        self._startJob(exportPlots,args,lambda result: self.statusBar().showMessage(f'Saved {len(result[0])} plots to {dirName}'),withProgress=True,message=f'Saving plots to {dirName}',ensure=self._plotDays(startDay,endDay,aggregation))
     
     def _addActivity(self):
         self.activityDialogue = activityDialogue(self)
@@ -254,98 +414,238 @@ class mainWindow(QMainWindow):
         self.fieldDialogue.show()
     
     def _updateFields(self):
-        currentItem = self.itemsBox.currentItem().text()
-        for key in self.editBoxes.keys():
-            self.items[self.currentDay][currentItem][key]['value'] = float(self.editBoxes[key].text())
+        self.fieldModel.commit()
+        self._shadeCalendars()
     
+    @timed
     def _changeDay(self):
-        self.currentDay = str(self.cal0.selectedDate().toJulianDay())
-        if not self.currentDay in self.items.keys():
-            self.items[self.currentDay] = self._copyDay()
+        self.currentDay = self.cal0.selectedDate().toJulianDay()
         self._displayItems()
         self._displayFields()
     
-    def _copyDay(self):
-        today = QDate.currentDate().toJulianDay()
-        mostRecentDay = str(max([int(key) for key in self.items.keys() if int(key)<=today]))
-        newDay = {}
-        for itemKey in self.items[mostRecentDay].keys():
-            newDay.update({itemKey: {}})
-            for fieldKey in self.items[mostRecentDay][itemKey].keys():
-                newDay[itemKey].update(itemField(fieldKey,0,self.items[mostRecentDay][itemKey][fieldKey]['unit']))
-        return newDay
+    def _schemaDay(self) -> int:
+        '''Day whose activities and fields are shown, a day without entries is not stored until a value is entered'''
+        return self.items.schemaDay(self.currentDay,QDate.currentDate().toJulianDay())
+    
+    def _startJob(self, function, args: tuple, onFinished, withProgress: bool = False, message: str = '', ensure=None):
+        '''Run function(*args) on the thread pool and pass its result to onFinished on the main thread'''
+        job = worker(function,args,withProgress,ensure)
+        job.signals.finished.connect(functools.partial(self._jobFinished,job,onFinished))
+        job.signals.failed.connect(functools.partial(self._jobFailed,job))
+        job.signals.progress.connect(self.progressBar.setValue)
+        self.jobs.add(job)
+        self.progressBar.setRange(0,100 if withProgress else 0)
+        self.progressBar.setValue(0)
+        self._setBusy(True)
+        self.statusBar().showMessage(message)
+        QThreadPool.globalInstance().start(job)
+    
+    def _jobFinished(self, job: worker, onFinished, result):
+        self._endJob(job)
+        self.statusBar().clearMessage()
+        onFinished(result)
+        if self.closeRequested and not len(self.jobs):
+            self.closeRequested = False
+            self.close()
+    
+    def _jobFailed(self, job: worker, message: str):
+        self._endJob(job)
+        self.closeRequested = False
+        self.statusBar().showMessage(f'Error: {message}')
+    
+    def _endJob(self, job: worker):
+        self.jobs.discard(job)
+        if not len(self.jobs):
+            self._setBusy(False)
+            self._shadeCalendars()
+    
+    def _setBusy(self, busy: bool):
+        '''Block edits and file operations while a worker is using the project'''
+        for widget in [self.activityButton, self.fieldButton, self.updateButton, self.cal0, self.plotButton, self.savePlotButton] + self.fileActions:
+            widget.setEnabled(not busy)
+        if busy:
+            QTimer.singleShot(PROGRESS_DELAY_MS,self._showProgress)
+        else:
+            self.progressBar.setVisible(False)
+    
+    def _showProgress(self):
+        self.progressBar.setVisible(len(self.jobs)>0)
+    
+    def _saveFirst(self, then):
+        if not self.currentFile=='':
+            self._saveThen(then)
+        else:
+            self._saveAsThen(then)
     
     def _new(self):
-        if self.itemsLoad!=self.items:
+        if self.items.isModified():
             self._unsavedChanges()
         else:
             self.saveFirst = False
             self.openOK = True
         if self.saveFirst:
-            if not self.currentFile=='':
-                self._save()
-            else:
-                self._saveAs()
-        if self.openOK:
-            self.items = {self.currentDay: {}}
-            self.itemsLoad = copy.deepcopy(self.items)
-            try:
-                self._displayItems()
-                self._displayFields()
-            except AttributeError: #Still initialising
-                pass
+            self._saveFirst(self._resetProject)
+        elif self.openOK:
+            self._resetProject()
+    
+    def _resetProject(self):
+        self.items = activityStore()
+        self.lastPlot = None
+        try:
+            self._displayItems()
+            self._displayFields()
+            self._shadeCalendars()
+        except AttributeError: #Still initialising
+            pass
     
     def _save(self):
+        self._saveThen(None)
+    
+    def _saveThen(self, then):
         if not self.currentFile=='':
-            saveFile(self.currentFile,self.items)
+            self._startSave(self.currentFile,then)
         else:
-            saveFile(f'{self.currentDirectory}activitytracker_{datetime.datetime.now().strftime("%Y-%m-%d_%I:%M%p")}.json',self.items)
-        self.itemsLoad = copy.deepcopy(self.items)
-        
+            self._startSave(f'{self.currentDirectory}activitytracker_{datetime.datetime.now().strftime("%Y-%m-%d_%I:%M%p")}.json',then)
     
     def _saveAs(self):
+        self._saveAsThen(None)
+    
+    def _saveAsThen(self, then):
         fileName = QFileDialog.getSaveFileName(self,'',self.currentDirectory)[0]
         if not fileName=='':
             self.currentFile = fileName
             self.currentDirectory = fileName[:-len(fileName.split('/')[-1])]
-            saveFile(fileName,self.items)
-            self._setTitle()
-            self.itemsLoad = copy.deepcopy(self.items)
+            self._startSave(fileName,then)
+        elif then is not None:
+            then()
+    
+    def _saveAsPartitioned(self):
+        dirName = QFileDialog.getExistingDirectory(self,'',self.currentDirectory)
+        if not dirName=='':
+            fileName = os.path.join(dirName,MANIFEST_NAME)
+            try:
+                checkPartitionedTarget(fileName)
+            except ValueError as error:
+                self.statusBar().showMessage(f'Error: {error}')
+                return
+            self.currentFile = fileName
+            self.currentDirectory = fileName[:-len(fileName.split('/')[-1])]
+            self._startSave(fileName,None)
+    
+    def _startSave(self, fileName: str, then):
+        '''Save on the thread pool, then() is called once the project is on disk'''
+        ensure = (self.items,None,None) if self.items.baseFile!=fileName else None #A full save reads every partition
+        self._startJob(saveFile,(fileName,self.items),functools.partial(self._saved,then),message=f'Saving {fileName}',ensure=ensure)
+    
+    def _saved(self, then, result):
+        self._setTitle()
+        if then is not None:
+            then()
     
     def _open(self):
-        if self.itemsLoad!=self.items:
+        if self.items.isModified():
             self._unsavedChanges()
         else:
             self.saveFirst = False
             self.openOK = True
         if self.saveFirst:
-            if not self.currentFile=='':
-                self._save()
-            else:
-                self._saveAs()
-        if self.openOK:
-            fileName = QFileDialog.getOpenFileName(self,'',self.currentDirectory)[0]
-            if not fileName=='':
-                try:
-                    self.cal0.setSelectedDate(QDate.currentDate())
-                    self.currentDay = str(self.cal0.selectedDate().toJulianDay())
-                    self.items = loadFile(fileName)
-                    if not self.currentDay in self.items.keys():
-                        self.items[self.currentDay] = self._copyDay()
-                    self.itemsLoad = copy.deepcopy(self.items)
-                    self._displayItems()
-                    self._displayFields()
-                    self.currentFile = fileName
-                    self.currentDirectory = fileName[:-len(fileName.split('/')[-1])]
-                    self._setTitle()
-                except Exception:
-                    pass
+            self._saveFirst(self._chooseAndOpen)
+        elif self.openOK:
+            self._chooseAndOpen()
+    
+    def _chooseAndOpen(self):
+        fileName = QFileDialog.getOpenFileName(self,'',self.currentDirectory)[0]
+        if not fileName=='':
+            self._startJob(loadFile,(fileName,),functools.partial(self._opened,fileName),withProgress=True,message=f'Opening {fileName}')
+    
+    def _opened(self, fileName: str, items: activityStore):
+        self.items = items
+        self.cal0.setSelectedDate(QDate.currentDate())
+        self.currentDay = self.cal0.selectedDate().toJulianDay()
+        self._displayItems()
+        self._displayFields()
+        self.currentFile = fileName
+        self.currentDirectory = fileName[:-len(fileName.split('/')[-1])]
+        self._shadeCalendars()
+        self._setTitle()
+    
+    def _openSeveral(self):
+        if self.items.isModified():
+            self._unsavedChanges()
+        else:
+            self.saveFirst = False
+            self.openOK = True
+        if self.saveFirst:
+            self._saveFirst(functools.partial(self._chooseAndMerge,False))
+        elif self.openOK:
+            self._chooseAndMerge(False)
+    
+    def _attach(self):
+        self._chooseAndMerge(True)
+    
+    def _chooseAndMerge(self, attach: bool):
+        '''Pick projects and how to merge them, into the open project when attaching or a new one'''
+        fileNames = QFileDialog.getOpenFileNames(self,'',self.currentDirectory)[0]
+        if not len(fileNames):
+            return
+        self.mDialogue = mergeDialogue(self,fileNames,attach)
+        self.mDialogue.setWindowTitle('Attach Projects' if attach else 'Open Several Projects')
+        self.mDialogue.setWindowModality(Qt.ApplicationModal)
+        self.mDialogue.show()
+    
+    def _startMerge(self, fileNames: list, separate: bool, overlap: str, attach: bool):
+        ensure = (self.items,None,None) if attach else None #Merging reads every partition of the open project
+        self._startJob(loadFiles,(fileNames,separate,overlap),functools.partial(self._merged,attach,overlap),withProgress=True,message=f'Opening {len(fileNames)} projects',ensure=ensure)
+    
+    def _merged(self, attach: bool, overlap: str, items: activityStore):
+        '''The worker only builds a new store, attaching merges it into the open project here on the main thread'''
+        if attach:
+            self.items.merge(items,'',overlap)
+        else: #A new project, saved under a new name
+            self.items = items
+            self.currentFile = ''
+            self.cal0.setSelectedDate(QDate.currentDate())
+            self.currentDay = self.cal0.selectedDate().toJulianDay()
+        self.lastPlot = None
+        self._displayItems()
+        self._displayFields()
+        self._shadeCalendars()
+        self._setTitle()
+    
+    def _importCsv(self):
+        fileNames = QFileDialog.getOpenFileNames(self,'',self.currentDirectory,'CSV files (*.csv);;All files (*)')[0]
+        if not len(fileNames):
+            return
+        self.iDialogue = importDialogue(self,fileNames)
+        self.iDialogue.setWindowTitle('Import CSV')
+        self.iDialogue.setWindowModality(Qt.ApplicationModal)
+        self.iDialogue.show()
+    
+    def _startImport(self, fileNames: list, overlap: str):
+        '''Read the files into a new store on the worker, knowing the units of the open project's fields'''
+        items = activityStore()
+        items.loadSchema(self.items.schema)
+        self._startJob(importCsv,(fileNames,items,overlap),functools.partial(self._imported,items,overlap),withProgress=True,message=f'Importing {len(fileNames)} files',ensure=(self.items,None,None))
+    
+    def _imported(self, items: activityStore, overlap: str, count: int):
+        self.items.merge(items,'',overlap)
+        self.lastPlot = None
+        self._displayItems()
+        self._displayFields()
+        self._shadeCalendars()
+        self._setTitle()
+        self.statusBar().showMessage(f'Imported {count} rows')
     
     def _helpPopUp(self):
         self.hWindow = helpWindow()
         self.hWindow.setWindowTitle(f'Activity Logger {VERSION_STRING} - Information')
         self.hWindow.show()
     
+    def _timingsPopUp(self):
+        self.tWindow = timingsWindow(self)
+        self.tWindow.setWindowTitle(f'Activity Logger {VERSION_STRING} - Timings')
+        self.tWindow.show()
+    
     def _unsavedChanges(self):
         self.wWindow = warningWindow(self)
         self.wWindow.setWindowTitle('Unsaved Changes')
@@ -356,17 +656,19 @@ class mainWindow(QMainWindow):
         self.setWindowTitle(f'Activity Logger {VERSION_STRING} - {self.currentDirectory}')
     
     def closeEvent(self, event):
+        if len(self.jobs): #Ask again once the running save or load has finished
+            self.closeRequested = True
+            event.ignore()
+            return
         self.saveFirst = False
         self.openOK = True
-        if self.itemsLoad!=self.items:
+        if self.items.isModified():
             event.ignore()
             self._unsavedChanges()
         if self.saveFirst:
-            if not self.currentFile=='':
-                self._save()
-            else:
-                self._saveAs()
-        if self.openOK:
+            event.ignore()
+            self._saveFirst(QApplication.closeAllWindows)
+        elif self.openOK:
             QApplication.closeAllWindows()
             event.accept()
 
@@ -386,9 +688,34 @@ class helpWindow(QWidget):
         self.closeButton.clicked.connect(self.close)
     
     def _helpText(self):
-        with open('helptext.txt','r') as f:
-            lines = f.readlines()
-        return lines
+        return getHelpText()
+
+class timingsWindow(QWidget):
+    '''Live call counts and times of the instrumented functions, only available when profiling'''
+    def __init__(self,parent):
+        super().__init__()
+        self.parent = parent
+        layout = QVBoxLayout()
+        self.timingsLabel = QLabel('')
+        self.timingsLabel.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        layout.addWidget(self.timingsLabel)
+        layout.addWidget(QLabel(f'Trace: {activityprofile.TRACE_FILE}'))
+        self.closeButton = QPushButton('OK')
+        layout.addWidget(self.closeButton)
+        self.setLayout(layout)
+        self.closeButton.clicked.connect(self.close)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self._refresh)
+        self.timer.start(TIMINGS_REFRESH_MS)
+        self._refresh()
+    
+    def _refresh(self):
+        lines = [f'{"Function":28s} {"Calls":>7s} {"Total ms":>10s} {"Mean ms":>9s} {"Max ms":>9s} {"Net kB":>9s}']
+        for name, calls, total, longest, allocated in activityprofile.PROFILER.summary():
+            lines.append(f'{name:28s} {calls:7d} {1000*total:10.1f} {1000*total/calls:9.2f} {1000*longest:9.2f} {allocated/1024:9.1f}')
+        cache = self.parent.items.seriesCacheInfo()
+        lines.append(f'Series cache: {cache["hits"]} hits, {cache["misses"]} misses, {cache["size"]} kept')
+        self.timingsLabel.setText('\n'.join(lines))
 
 class warningWindow(QDialog):
     '''Project change warning dialogue'''
@@ -448,11 +775,12 @@ class activityDialogue(QDialog):
     
     def _accept(self):
         qText = self.textBox.text()
-        if (qText in self.parent.items[self.parent.currentDay].keys() or not len(qText)):
+        if (qText in self.parent.items.activities(self.parent._schemaDay()) or not len(qText)):
             return
         else:
-            self.parent.items[self.parent.currentDay].update({qText: {}})
+            self.parent.items.addActivity(self.parent.currentDay,qText)
             self.parent._displayItems()
+            self.parent._shadeCalendars()
             self.close()
 
 class fieldDialogue(QDialog):
@@ -486,17 +814,108 @@ class fieldDialogue(QDialog):
         labelText = self.labelBox.text()
         valueText = self.valueBox.text()
         unitText = self.unitBox.text()
-        itemKey = self.parent.itemsBox.currentItem().text()
-        if not labelText in self.parent.items[self.parent.currentDay][itemKey].keys():
+        itemKey = self.parent._currentActivity()
+        if itemKey is None:
+            return
+        if not labelText in self.parent.items.fields(self.parent._schemaDay(),itemKey):
             try:
-                self.parent.items[self.parent.currentDay][itemKey].update(itemField(labelText,float(valueText),unitText))
+                self.parent.items.addField(self.parent.currentDay,itemKey,labelText,float(valueText),unitText)
                 self.parent._displayFields()
+                self.parent._shadeCalendars()
             except Exception:
                 pass
             self.close()
         else:
             return
 
+class exportDialogue(QDialog):
+    '''Options of the export of every plot'''
+    def __init__(self,parent,dirName):
+        super().__init__()
+        self.parent = parent
+        self.dirName = dirName
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(f'Save a plot of every field to {dirName} with the current plot settings'))
+        self.pdfBox = QCheckBox('Also save all plots in one PDF (plots.pdf)')
+        layout.addWidget(self.pdfBox)
+        buttons = QHBoxLayout()
+        self.acceptButton = QPushButton('OK')
+        buttons.addWidget(self.acceptButton)
+        self.cancelButton = QPushButton('Cancel')
+        buttons.addWidget(self.cancelButton)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+        self.acceptButton.clicked.connect(self._accept)
+        self.cancelButton.clicked.connect(self.close)
+    
+    def _accept(self):
+        self.parent._startExportAll(self.dirName,self.pdfBox.isChecked())
+        self.close()
+
+class mergeDialogue(QDialog):
+    '''Choose how several projects are merged'''
+    def __init__(self,parent,fileNames,attach):
+        super().__init__()
+        self.parent = parent
+        self.fileNames = fileNames
+        self.attach = attach
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(f'{len(fileNames)} projects selected'))
+        activitiesLayout = QHBoxLayout()
+        activitiesLayout.addWidget(QLabel('Activities with the same name:'))
+        self.activitiesBox = QComboBox()
+        self.activitiesBox.addItems(['Combine', 'Keep apart per project'])
+        activitiesLayout.addWidget(self.activitiesBox)
+        layout.addLayout(activitiesLayout)
+        overlapLayout = QHBoxLayout()
+        overlapLayout.addWidget(QLabel('Entries on the same day:'))
+        self.overlapBox = QComboBox()
+        self.overlapBox.addItems(MERGE_OVERLAPS)
+        overlapLayout.addWidget(self.overlapBox)
+        layout.addLayout(overlapLayout)
+        buttons = QHBoxLayout()
+        self.acceptButton = QPushButton('OK')
+        buttons.addWidget(self.acceptButton)
+        self.cancelButton = QPushButton('Cancel')
+        buttons.addWidget(self.cancelButton)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+        self.acceptButton.clicked.connect(self._accept)
+        self.cancelButton.clicked.connect(self.close)
+    
+    def _accept(self):
+        self.parent._startMerge(self.fileNames,self.activitiesBox.currentIndex()==1,self.overlapBox.currentText(),self.attach)
+        self.close()
+
+class importDialogue(QDialog):
+    '''Choose how imported values are combined with those already entered'''
+    def __init__(self,parent,fileNames):
+        super().__init__()
+        self.parent = parent
+        self.fileNames = fileNames
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(f'{len(fileNames)} files selected, with the columns date, activity, field, value, unit'))
+        overlapLayout = QHBoxLayout()
+        overlapLayout.addWidget(QLabel('Values already entered:'))
+        self.overlapBox = QComboBox()
+        self.overlapBox.addItems(MERGE_OVERLAPS)
+        self.overlapBox.setCurrentText('Last')
+        overlapLayout.addWidget(self.overlapBox)
+        layout.addLayout(overlapLayout)
+        buttons = QHBoxLayout()
+        self.acceptButton = QPushButton('OK')
+        buttons.addWidget(self.acceptButton)
+        self.cancelButton = QPushButton('Cancel')
+        buttons.addWidget(self.cancelButton)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+        self.acceptButton.clicked.connect(self._accept)
+        self.cancelButton.clicked.connect(self.close)
+    
+    def _accept(self):
+        self.parent._startImport(self.fileNames,self.overlapBox.currentText())
+        self.close()
+
 class controller:
     '''Controller module'''
     def __init__(self,model,view):
@@ -506,10 +925,12 @@ class controller:
     
     def _connectSignalsAndSlots(self):
         self._view.activityButton.clicked.connect(self._view._addActivity)
-        self._view.itemsBox.currentItemChanged.connect(self._view._displayFields)
+        self._view.itemsBox.selectionModel().currentChanged.connect(self._view._displayFields)
         self._view.fieldButton.clicked.connect(self._view._addField)
         self._view.updateButton.clicked.connect(self._view._updateFields)
         self._view.cal0.selectionChanged.connect(self._view._changeDay)
+        for calendar in [self._view.cal0, self._view.cal1, self._view.cal2]:
+            calendar.currentPageChanged.connect(functools.partial(self._view._shadeCalendar,calendar))
         self._view.plotButton.clicked.connect(self._view._generatePlot)
         self._view.savePlotButton.clicked.connect(self._view._exportPlot)
 
@@ -518,6 +939,7 @@ def main():
     elApp = QApplication([])
     elWindow = mainWindow()
     elWindow.show()
+    QTimer.singleShot(PLOT_WARMUP_MS,elWindow._createPlotCanvas)
     controller(model=None,view=elWindow)
     sys.exit(elApp.exec())
 
@@ -0,0 +1,183 @@
+"""
+Copyright (C) 2023  Craig S. Chisholm
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+#Hot path benchmark on a generated project of years x activities x fields:
+#loading and saving each format, switching day, month and activity in the
+#main window, plotting and range statistics, all under the offscreen Qt platform.
+#Each case reports the median wall time of its runs and the peak memory
+#allocated by Python objects and numpy arrays (tracemalloc) during one run.
+#
+#  python benchmarks/hotpaths.py [--years N] [--activities N] [--fields N] [--runs N] [--save baseline.json] [--baseline baseline.json]
+
+import sys
+import os
+import json
+import time
+import shutil
+import datetime
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+import numpy as np
+
+os.environ.setdefault('QT_QPA_PLATFORM','offscreen')
+REPO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,REPO_DIRECTORY)
+
+import activitytracker
+from PyQt5.QtCore import QDate, QThreadPool
+from activityio import loadFile, saveFile, julianDay
+
+#A case slower or larger than the baseline by more than this fraction is a regression
+TOLERANCE = 0.25
+
+#Differences smaller than this are timer noise (seconds and bytes)
+NOISE_FLOOR = {'time': 0.002, 'memory': 64*1024}
+
+#Days selected one after the other by the day switching case
+SWITCH_DAYS = 60
+
+#Months shown one after the other by the month switching case, a decade
+SWITCH_MONTHS = 120
+
+def generateProject(years: int, activities: int, fields: int, density: float = 0.8, seed: int = 0) -> dict:
+    '''Deterministic project in the day->item->field layout ending today, each activity is logged on a density fraction of days'''
+    rng = np.random.default_rng(seed)
+    lastDay = julianDay(datetime.date.today())
+    days = np.arange(lastDay - 365*years + 1, lastDay + 1)
+    project = {}
+    for itemIndex in range(activities):
+        itemKey = f'Activity {itemIndex}'
+        logged = days[rng.random(len(days))<density]
+        values = np.round(rng.gamma(2.,5.,(len(logged),fields)),2)
+        for day, row in zip(logged.tolist(), values.tolist()):
+            project.setdefault(str(day),{})[itemKey] = {f'Field {fieldIndex}': {'value': value, 'unit': f'unit {fieldIndex}'} for fieldIndex, value in enumerate(row)}
+    return dict(sorted(project.items()))
+
+def waitForJobs(app, window):
+    '''Let the worker finish and deliver its result to the main thread'''
+    while len(window.jobs):
+        QThreadPool.globalInstance().waitForDone()
+        app.processEvents()
+
+def cases(app, dirName: str) -> dict:
+    '''Name -> (setup, run), setup builds fresh state so every run does the same work'''
+    jsonName = os.path.join(dirName,'project.json')
+    binaryName = os.path.join(dirName,'project.atcol')
+    window = activitytracker.mainWindow()
+    activitytracker.controller(None,window) #Connects the calendar and activity list to the slots being timed
+    window._createPlotCanvas()
+    def openWindow():
+        window._opened(jsonName,loadFile(jsonName))
+        return window
+    def switchDays(window):
+        for offset in range(SWITCH_DAYS):
+            window.cal0.setSelectedDate(QDate.currentDate().addDays(-offset))
+    def switchMonths(window):
+        for offset in range(SWITCH_MONTHS):
+            date = QDate.currentDate().addMonths(-offset)
+            window.cal0.setCurrentPage(date.year(),date.month())
+    def switchActivities(window):
+        for row in range(window.itemModel.rowCount()):
+            window.itemsBox.setCurrentIndex(window.itemModel.index(row))
+    def plot(window):
+        window.plotRange.setCurrentText('All time')
+        window._generatePlot()
+        waitForJobs(app,window)
+    def stats(items):
+        for itemKey, fields in items.schema.items():
+            for fieldKey in fields.keys():
+                items.stats.clear()
+                items.rangeStats(itemKey,fieldKey)
+    def edited():
+        '''A saved project with one pending edit, which is appended to its journal'''
+        journalName = os.path.join(dirName,'journal.json')
+        shutil.copyfile(jsonName,journalName)
+        if os.path.exists(journalName + '.journal'):
+            os.remove(journalName + '.journal')
+        items = loadFile(journalName)
+        items.setValue(items.mostRecentDay(julianDay(datetime.date.today())),'Activity 0','Field 0',-1.)
+        return items
+    return {
+        'load_json': (lambda: jsonName, loadFile),
+        'load_binary': (lambda: binaryName, loadFile),
+        'save_json': (lambda: loadFile(jsonName), lambda items: saveFile(os.path.join(dirName,'copy.json'),items)),
+        'save_journal': (edited, lambda items: saveFile(items.baseFile,items)),
+        'save_binary': (lambda: loadFile(jsonName), lambda items: saveFile(os.path.join(dirName,'copy.atcol'),items)),
+        'change_day': (openWindow, switchDays),
+        'change_month': (openWindow, switchMonths),
+        'display_fields': (openWindow, switchActivities),
+        'generate_plot': (openWindow, plot),
+        'range_stats': (lambda: loadFile(binaryName), stats),
+        }
+
+def measure(setup, run, runs: int) -> dict:
+    times = []
+    for index in range(runs):
+        state = setup()
+        started = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - started)
+    state = setup()
+    tracemalloc.start()
+    run(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'time': statistics.median(times), 'memory': peak}
+
+def main():
+    parser = argparse.ArgumentParser(description='Hot path benchmark of activitytracker on generated data')
+    parser.add_argument('--years',type=int,default=5)
+    parser.add_argument('--activities',type=int,default=5)
+    parser.add_argument('--fields',type=int,default=6)
+    parser.add_argument('--seed',type=int,default=0)
+    parser.add_argument('--runs',type=int,default=5)
+    parser.add_argument('--only',nargs='+',help='run only these cases')
+    parser.add_argument('--save',help='write the results to this file as a new baseline')
+    parser.add_argument('--baseline',help='compare the results with this file, exit with 1 on a regression')
+    args = parser.parse_args()
+    app = activitytracker.QApplication([])
+    dirName = tempfile.mkdtemp()
+    try:
+        jsonName = os.path.join(dirName,'project.json')
+        with open(jsonName,'w') as f:
+            f.write(json.dumps(generateProject(args.years,args.activities,args.fields,seed=args.seed)))
+        saveFile(os.path.join(dirName,'project.atcol'),loadFile(jsonName))
+        print(f'{args.years} years x {args.activities} activities x {args.fields} fields, {os.path.getsize(jsonName)/2**20:.1f} MB of JSON')
+        results = {}
+        for name, (setup, run) in cases(app,dirName).items():
+            if args.only and not name in args.only:
+                continue
+            results[name] = measure(setup,run,args.runs)
+            print(f'{name:16s} {1000*results[name]["time"]:9.1f} ms {results[name]["memory"]/2**20:9.2f} MB')
+    finally:
+        shutil.rmtree(dirName)
+    if args.save:
+        with open(args.save,'w') as f:
+            f.write(json.dumps(results,indent=2))
+    if args.baseline:
+        with open(args.baseline,'r') as f:
+            baseline = json.loads(f.read())
+        regressions = [(name, key) for name in results.keys() if name in baseline.keys() for key in ['time','memory'] if results[name][key]>max(baseline[name][key]*(1+TOLERANCE), baseline[name][key]+NOISE_FLOOR[key])]
+        for name, key in regressions:
+            print(f'Regression: {name} {key} {results[name][key]:.4g}, baseline {baseline[name][key]:.4g}',file=sys.stderr)
+        if len(regressions):
+            sys.exit(1)
+
+if (__name__=='__main__'):
+    main()
@@ -0,0 +1,98 @@
+"""
+Copyright (C) 2023  Craig S. Chisholm
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+#Cold start benchmark: each run is a fresh interpreter which imports
+#activitytracker, builds the main window under the offscreen Qt platform
+#and stops at the first paint event of the window.
+#
+#  python benchmarks/startup.py [--runs N] [--save baseline.json] [--baseline baseline.json]
+
+import sys
+import os
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+REPO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#A run slower than the baseline by more than this fraction is a regression
+TOLERANCE = 0.25
+
+def child():
+    '''Runs inside the measured interpreter, prints wall clock timestamps as JSON'''
+    started = time.time()
+    sys.path.insert(0,REPO_DIRECTORY)
+    import activitytracker
+    imported = time.time()
+    from PyQt5.QtCore import QObject, QEvent, QTimer
+    class paintFilter(QObject):
+        def eventFilter(self, watched, event):
+            if event.type()==QEvent.Paint and not 'painted' in times.keys():
+                times['painted'] = time.time()
+                QTimer.singleShot(0,app.quit)
+            return False
+    times = {'started': started, 'imported': imported}
+    app = activitytracker.QApplication([])
+    window = activitytracker.mainWindow()
+    watcher = paintFilter()
+    window.installEventFilter(watcher)
+    window.show()
+    app.exec()
+    print(json.dumps(times))
+
+def measure() -> dict:
+    '''One cold start, times in seconds from spawning the interpreter'''
+    env = dict(os.environ,QT_QPA_PLATFORM='offscreen')
+    spawned = time.time()
+    output = subprocess.run([sys.executable,os.path.abspath(__file__),'--child'],env=env,cwd=REPO_DIRECTORY,capture_output=True,text=True,check=True).stdout
+    times = json.loads(output.strip().splitlines()[-1])
+    return {
+        'interpreter': times['started'] - spawned,
+        'import': times['imported'] - times['started'],
+        'first_paint': times['painted'] - spawned,
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold start benchmark of activitytracker.py')
+    parser.add_argument('--runs',type=int,default=5)
+    parser.add_argument('--save',help='write the medians to this file as a new baseline')
+    parser.add_argument('--baseline',help='compare the medians with this file, exit with 1 on a regression')
+    parser.add_argument('--child',action='store_true',help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+    runs = [measure() for run in range(args.runs)]
+    medians = {key: statistics.median(run[key] for run in runs) for key in runs[0].keys()}
+    for key, value in medians.items():
+        print(f'{key:12s} {1000*value:8.1f} ms')
+    if args.save:
+        with open(args.save,'w') as f:
+            f.write(json.dumps(medians,indent=2))
+    if args.baseline:
+        with open(args.baseline,'r') as f:
+            baseline = json.loads(f.read())
+        regressions = [key for key in ['import','first_paint'] if medians[key]>baseline[key]*(1+TOLERANCE)]
+        for key in regressions:
+            print(f'Regression: {key} {1000*medians[key]:.1f} ms, baseline {1000*baseline[key]:.1f} ms',file=sys.stderr)
+        if len(regressions):
+            sys.exit(1)
+
+if (__name__=='__main__'):
+    main()
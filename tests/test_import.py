@@ -0,0 +1,108 @@
+"""
+Copyright (C) 2023  Craig S. Chisholm
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+#Importing long format CSV files, run with python -m pytest tests
+
+import os
+import sys
+import pytest
+
+REPO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,REPO_DIRECTORY)
+
+import activityio
+from activityio import importCsv
+from activitystore import activityStore, MERGE_OVERLAPS
+
+#2023-01-01
+FIRST_DAY = 2459946
+
+def writeCsv(tmp_path, lines: list, name: str = 'values.csv', encoding: str = 'utf-8') -> str:
+    fileName = str(tmp_path/name)
+    with open(fileName,'w',encoding=encoding,newline='') as f:
+        f.write('\r\n'.join(lines) + '\r\n')
+    return fileName
+
+def test_header(tmp_path):
+    '''A header row is skipped, including behind the byte order mark spreadsheets write'''
+    rows = ['2023-01-01,Run,Distance,5,km', '2023-01-02,Run,Distance,7,km']
+    for encoding, header in [('utf-8', 'date,activity,field,value,unit'), ('utf-8-sig', 'date,activity,field,value,unit'), ('utf-8-sig', 'Date, Activity, Field, Value, Unit'), ('utf-8-sig', None)]:
+        items = activityStore()
+        fileName = writeCsv(tmp_path,([] if header is None else [header]) + rows,encoding=encoding)
+        assert importCsv([fileName],items)==2
+        assert items.toDict()=={
+            str(FIRST_DAY): {'Run': {'Distance': {'value': 5., 'unit': 'km'}}},
+            str(FIRST_DAY+1): {'Run': {'Distance': {'value': 7., 'unit': 'km'}}},
+            }
+
+def test_trimmed(tmp_path):
+    fileName = writeCsv(tmp_path,[' 2023-01-01 , Run ,Distance , 5 , km ', '2023-01-02,Run,Distance,7,km'])
+    items = activityStore()
+    importCsv([fileName],items)
+    assert items.schema=={'Run': {'Distance': 'km'}}
+    assert items.value(FIRST_DAY,'Run','Distance')==5.
+
+def test_withoutUnit(tmp_path):
+    '''Rows without a unit take the unit of the field, from the project or a later row'''
+    fileName = writeCsv(tmp_path,[
+        '2023-01-01,Run,Distance,5',
+        '2023-01-02,Run,Distance,7,km',
+        '2023-01-03,Piano,Practice,1,',
+        '2023-01-04,Swim,Laps,20',
+        ])
+    items = activityStore()
+    items.addField(FIRST_DAY-10,'Piano','Practice',2.,'h')
+    assert importCsv([fileName],items)==4
+    assert items.schema=={'Piano': {'Practice': 'h'}, 'Run': {'Distance': 'km'}, 'Swim': {'Laps': ''}}
+    assert items.value(FIRST_DAY,'Run','Distance')==5.
+    assert items.value(FIRST_DAY+2,'Piano','Practice')==1.
+    assert items.value(FIRST_DAY+3,'Swim','Laps')==20.
+
+def test_withoutUnitAcrossChunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(activityio,'CSV_CHUNK',1)
+    fileName = writeCsv(tmp_path,['2023-01-01,Run,Distance,5', '2023-01-02,Run,Distance,7,km'])
+    items = activityStore()
+    importCsv([fileName],items)
+    assert items.schema=={'Run': {'Distance': 'km'}}
+
+@pytest.mark.parametrize('overlap, expected', [('Sum', 13.), ('First', 3.), ('Last', 6.), ('Max', 6.)])
+def test_overlap(tmp_path, overlap, expected):
+    '''Values given twice in the files, and already in the project, are combined by overlap'''
+    assert overlap in MERGE_OVERLAPS
+    fileName = writeCsv(tmp_path,['2023-01-01,Run,Distance,4,km', '2023-01-02,Run,Distance,5,km', '2023-01-01,Run,Distance,6,km'])
+    items = activityStore()
+    items.addField(FIRST_DAY,'Run','Distance',3.,'km')
+    importCsv([fileName],items,overlap)
+    assert items.value(FIRST_DAY,'Run','Distance')==expected
+    assert items.value(FIRST_DAY+1,'Run','Distance')==5.
+
+def test_unitConflict(tmp_path):
+    '''A field given in another unit becomes "field (unit)" rather than mixing units'''
+    fileName = writeCsv(tmp_path,['2023-01-02,Run,Distance,3,mi', '2023-01-03,Run,Distance,8,km', '2023-01-04,Run,Distance,2'])
+    items = activityStore()
+    items.addField(FIRST_DAY,'Run','Distance',5.,'km')
+    importCsv([fileName],items)
+    assert items.schema=={'Run': {'Distance': 'km', 'Distance (mi)': 'mi'}}
+    assert items.value(FIRST_DAY+1,'Run','Distance (mi)')==3.
+    assert items.value(FIRST_DAY+1,'Run','Distance')==0.
+    assert items.value(FIRST_DAY+2,'Run','Distance')==8.
+    assert items.value(FIRST_DAY+3,'Run','Distance')==2.
+
+def test_badRows(tmp_path):
+    fileName = writeCsv(tmp_path,['2023-01-01,Run,Distance'])
+    with pytest.raises(ValueError):
+        importCsv([fileName],activityStore())
@@ -0,0 +1,191 @@
+"""
+Copyright (C) 2023  Craig S. Chisholm
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+#Project files on disk: journal replay and recovery, compaction and the
+#round trips of the partitioned and binary formats, and range statistics
+#against statistics of the values themselves, run with python -m pytest tests
+
+import os
+import sys
+import threading
+import numpy as np
+import pytest
+
+REPO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,REPO_DIRECTORY)
+
+import activityio
+from activityio import loadFile, saveFile, JOURNAL_SUFFIX, MANIFEST_NAME, BINARY_SUFFIX
+from activitystore import activityStore, valueStats
+
+#A Julian day in 2023, partitions are per calendar year
+FIRST_DAY = 2459946
+
+def makeProject(days: int = 500, seed: int = 0) -> activityStore:
+    '''Two activities logged on random days across two calendar years, with some zero values'''
+    rng = np.random.default_rng(seed)
+    items = activityStore()
+    for day in range(FIRST_DAY, FIRST_DAY + days):
+        if rng.random()<0.3:
+            continue
+        items.addField(day,'Run','Distance',float(rng.integers(0,20)),'km')
+        if rng.random()<0.5:
+            items.addField(day,'Piano','Practice',round(float(rng.random()),3),'h')
+    return items
+
+def assertSameProject(items: activityStore, other: activityStore):
+    assert other.toDict()==items.toDict()
+    assert other.schema==items.schema
+    assert other.itemSince==items.itemSince
+    assert other.fieldSince==items.fieldSince
+
+def test_journalReplay(tmp_path):
+    fileName = str(tmp_path/'project.json')
+    items = makeProject()
+    saveFile(fileName,items)
+    with open(fileName,'rb') as f:
+        snapshot = f.read()
+    items.setValue(FIRST_DAY+3,'Run','Distance',42.)
+    items.addField(FIRST_DAY+900,'Run','Time',30.,'min')
+    items.addActivity(FIRST_DAY+901,'Swim')
+    saveFile(fileName,items)
+    with open(fileName,'rb') as f:
+        assert f.read()==snapshot #Edits only go to the journal
+    assert os.path.exists(fileName + JOURNAL_SUFFIX)
+    assertSameProject(items,loadFile(fileName))
+
+def test_tornAppend(tmp_path):
+    fileName = str(tmp_path/'project.json')
+    items = makeProject()
+    saveFile(fileName,items)
+    items.setValue(FIRST_DAY+3,'Run','Distance',42.)
+    saveFile(fileName,items)
+    with open(fileName + JOURNAL_SUFFIX,'a') as f:
+        f.write('{"op": "value", "day": 24')
+    reloaded = loadFile(fileName)
+    assertSameProject(items,reloaded)
+    reloaded.setValue(FIRST_DAY+5,'Run','Distance',7.)
+    saveFile(fileName,reloaded) #Appended on a fresh line after the torn record
+    assertSameProject(reloaded,loadFile(fileName))
+
+def test_compaction(tmp_path, monkeypatch):
+    fileName = str(tmp_path/'project.json')
+    items = makeProject()
+    saveFile(fileName,items)
+    items.setValue(FIRST_DAY+3,'Run','Distance',42.)
+    saveFile(fileName,items)
+    monkeypatch.setattr(activityio,'JOURNAL_LIMIT',0)
+    items.setValue(FIRST_DAY+4,'Run','Distance',43.)
+    saveFile(fileName,items)
+    assert not os.path.exists(fileName + JOURNAL_SUFFIX)
+    assertSameProject(items,loadFile(fileName))
+
+def test_staleJournal(tmp_path):
+    '''A journal left over from an older snapshot is discarded, not replayed'''
+    fileName = str(tmp_path/'project.json')
+    items = makeProject()
+    saveFile(fileName,items)
+    items.setValue(FIRST_DAY+3,'Run','Distance',42.)
+    saveFile(fileName,items)
+    with open(fileName + JOURNAL_SUFFIX,'r') as f:
+        journal = f.read()
+    activityio.compactFile(fileName,items)
+    with open(fileName + JOURNAL_SUFFIX,'w') as f:
+        f.write(journal.replace('42.0','-1.0'))
+    assertSameProject(items,loadFile(fileName))
+    assert not os.path.exists(fileName + JOURNAL_SUFFIX)
+
+def test_partitionedRoundTrip(tmp_path):
+    fileName = str(tmp_path/'project'/MANIFEST_NAME)
+    items = makeProject()
+    saveFile(fileName,items)
+    assert sorted(os.listdir(tmp_path/'project'))==['2023.json', '2024.json', MANIFEST_NAME]
+    reloaded = loadFile(fileName)
+    assert reloaded.loader is not None #Nothing is read before it is needed
+    reloaded.ensure()
+    assertSameProject(items,reloaded)
+    other = tmp_path/'project'/'2023.json'
+    reloaded = loadFile(str(tmp_path/'project'))
+    reloaded.setValue(FIRST_DAY+450,'Run','Distance',42.)
+    os.utime(other,(0, 0))
+    saveFile(fileName,reloaded)
+    assert os.path.getmtime(other)==0 #Only the edited year is rewritten
+    items.setValue(FIRST_DAY+450,'Run','Distance',42.)
+    reloaded = loadFile(fileName)
+    reloaded.ensure()
+    assertSameProject(items,reloaded)
+
+def test_partitionedConcurrentEnsure(tmp_path):
+    '''A worker reading every partition while the main thread reads single days'''
+    fileName = str(tmp_path/'project'/MANIFEST_NAME)
+    items = makeProject(days=1500)
+    saveFile(fileName,items)
+    reloaded = loadFile(fileName)
+    thread = threading.Thread(target=reloaded.ensure)
+    thread.start()
+    for day in range(FIRST_DAY, FIRST_DAY + 1500, 7):
+        assert reloaded.value(day,'Run','Distance')==items.value(day,'Run','Distance')
+    thread.join()
+    assert reloaded.loader is None
+    assertSameProject(items,reloaded)
+
+def test_partitionedTarget(tmp_path):
+    '''A partitioned project is never written over other files'''
+    (tmp_path/'2023.json').write_text('{}')
+    with pytest.raises(ValueError):
+        saveFile(str(tmp_path/MANIFEST_NAME),makeProject())
+    assert (tmp_path/'2023.json').read_text()=='{}'
+
+def test_binaryRoundTrip(tmp_path):
+    fileName = str(tmp_path/('project' + BINARY_SUFFIX))
+    items = makeProject()
+    saveFile(fileName,items)
+    reloaded = loadFile(fileName)
+    assert isinstance(reloaded.columns[('Run', 'Distance')],np.memmap)
+    assertSameProject(items,reloaded)
+    reloaded.setValue(FIRST_DAY+3,'Run','Distance',42.)
+    saveFile(fileName,reloaded) #Over the file its columns are mapped from
+    assert not any(isinstance(column, np.memmap) for column in reloaded.columns.values())
+    items.setValue(FIRST_DAY+3,'Run','Distance',42.)
+    assertSameProject(items,loadFile(fileName))
+    reloaded = loadFile(fileName)
+    reloaded.addField(FIRST_DAY+600,'Swim','Laps',12.,'')
+    saveFile(fileName,reloaded)
+    items.addField(FIRST_DAY+600,'Swim','Laps',12.,'')
+    assertSameProject(items,loadFile(fileName))
+
+def assertRangeStats(items: activityStore, rng, days: int, queries: int = 200):
+    for i in range(queries):
+        startDay, endDay = sorted(rng.integers(FIRST_DAY-20,FIRST_DAY+days+20,2))
+        startDay, endDay = int(startDay), int(endDay)
+        expected = valueStats(items.series('Run','Distance',startDay,endDay)[1])
+        stats = items.rangeStats('Run','Distance',startDay,endDay)
+        if expected is None:
+            assert stats is None
+        else:
+            assert stats==pytest.approx(expected)
+    assert items.rangeStats('Run','Distance')==pytest.approx(valueStats(items.series('Run','Distance')[1]))
+
+def test_rangeStats():
+    rng = np.random.default_rng(1)
+    items = makeProject(days=2000,seed=1)
+    assertRangeStats(items,rng,2000)
+    for i in range(100): #Updated in place after the index is built
+        day = FIRST_DAY + int(rng.integers(0,2000))
+        items.setValue(day,'Run','Distance',float(rng.choice([0, rng.integers(1,50)])))
+    assertRangeStats(items,rng,2000)
+    assert items.rangeStats('Run','Distance',FIRST_DAY-10,FIRST_DAY-1) is None
@@ -0,0 +1,109 @@
+"""
+Copyright (C) 2023  Craig S. Chisholm
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+#The in memory store: day summaries used to shade the calendars and the
+#range statistics index, run with python -m pytest tests
+
+import os
+import sys
+import numpy as np
+
+REPO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,REPO_DIRECTORY)
+
+from activityio import loadFile, saveFile, BINARY_SUFFIX
+from activitystore import activityStore, statsIndex
+
+#2023-01-01
+FIRST_DAY = 2459946
+
+def makeProject(days: int = 300, seed: int = 0) -> tuple:
+    '''A store with entries on random days, some days with an activity but no values,
+    and the number of values entered on each day'''
+    rng = np.random.default_rng(seed)
+    items = activityStore()
+    entries = {}
+    for day in range(FIRST_DAY, FIRST_DAY + days):
+        draw = rng.random()
+        if draw<0.3:
+            continue
+        elif draw<0.4:
+            items.addActivity(day,'Run')
+            entries[day] = 0
+            continue
+        items.addField(day,'Run','Distance',float(rng.integers(1,20)),'km')
+        entries[day] = 1
+        if rng.random()<0.5:
+            items.addField(day,'Piano','Practice',1.,'h')
+            entries[day] += 1
+    return items, entries
+
+def assertSummary(items: activityStore, entries: dict, firstDay: int, lastDay: int):
+    present, counts = items.daySummary(firstDay,lastDay)
+    days = range(firstDay, lastDay + 1)
+    assert present.tolist()==[day in entries.keys() for day in days]
+    assert counts.tolist()==[entries.get(day, 0) for day in days]
+
+def summaryWindows(items: activityStore) -> list:
+    '''Month sized windows before, inside, straddling and after the stored days'''
+    end = items.start + items.capacity
+    return [
+        (items.start - 100, items.start - 70),
+        (items.start - 15, items.start + 15),
+        (items.start + 40, items.start + 70),
+        (items.start - 10, end + 10),
+        (end - 15, end + 15),
+        (end, end + 30),
+        (end + 1, end + 31),
+        (end + 20, end + 50),
+        (end + 48, end + 78),
+        (end + 1000, end + 1030),
+        ]
+
+def test_daySummary(tmp_path):
+    items, entries = makeProject()
+    for firstDay, lastDay in summaryWindows(items):
+        assertSummary(items,entries,firstDay,lastDay)
+    fileName = str(tmp_path/('project' + BINARY_SUFFIX))
+    saveFile(fileName,items) #Trimmed to the populated days when reloaded
+    items = loadFile(fileName)
+    for firstDay, lastDay in summaryWindows(items):
+        assertSummary(items,entries,firstDay,lastDay)
+    assert items.mostEntries()==max(entries.values())
+
+def test_daySummaryNewProject():
+    items = activityStore()
+    assertSummary(items,{},FIRST_DAY,FIRST_DAY + 30)
+    items.addField(FIRST_DAY,'Run','Distance',5.,'km')
+    for month in range(6):
+        assertSummary(items,{FIRST_DAY: 1},FIRST_DAY + 30*month - 10,FIRST_DAY + 30*month + 20)
+
+def test_statsIndexUpdate():
+    '''An index updated in place matches one built from the updated column'''
+    rng = np.random.default_rng(2)
+    column = rng.integers(0,5,1000).astype(float)
+    column[rng.random(1000)<0.3] = np.nan
+    index = statsIndex(column)
+    for i in range(300):
+        position = int(rng.integers(0,1000))
+        column[position] = rng.choice([np.nan, 0., float(rng.integers(1,5))])
+        index.update(position,column[position])
+    rebuilt = statsIndex(column)
+    for level, other in zip(index.levels, rebuilt.levels):
+        assert np.array_equal(level,other)
+    for first, last in rng.integers(0,1000,(50, 2)):
+        assert index.query(int(first),int(last))==rebuilt.query(int(first),int(last))